@@ -0,0 +1,140 @@
+"""
+End-to-end pipeline benchmark.
+
+Builds datasets with generate_log_data_fast for every combination of event
+and user counts, times each pipeline stage in a fresh process and records
+the peak RSS after every stage. Results are written as JSON and can be
+compared against a stored baseline:
+
+    python -m benchmarks.bench_pipeline --events 1e4 1e5 1e6 --users 100 1000
+    python -m benchmarks.bench_pipeline --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Average events a normal user produces per day in generate_log_data_fast
+EVENTS_PER_USER_DAY = 200 / 7
+
+DATA_DIR = 'data/bench'
+RESULTS_PATH = 'outputs/benchmark_results.json'
+
+def dataset_path(events, users, seed, data_dir=DATA_DIR):
+    """Generate (or reuse) a CSV with roughly `events` events from `users` users"""
+    from generate_logs import generate_log_data_fast
+
+    path = os.path.abspath(os.path.join(data_dir, f'logs_{events}_{users}_{seed}.csv'))
+    if not os.path.exists(path):
+        days = max(1, round(events / (users * EVENTS_PER_USER_DAY)))
+        generate_log_data_fast(num_users=users, days=days, output_path=path, seed=seed,
+                               start=datetime(2025, 1, 1))
+    return path
+
+def run_stages(path):
+    """Run every pipeline stage on `path` in this process and time each one"""
+    from src.ingest import load_logs
+    from src.feature_engineer import extract_features, add_department_access_features
+    from src.model import detect_anomalies
+    from src.instrumentation import StageRecorder
+
+    recorder = StageRecorder()
+
+    def timed(stage, func, *args):
+        with recorder.stage(stage):
+            return func(*args)
+
+    def write_outputs(results):
+        anomalies = results[results['anomaly_score'] == -1]
+        anomalies.to_json('outputs/anomalies.json', orient='records', indent=2)
+        return anomalies
+
+    # Model outputs are written relative to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs('outputs')
+        df = timed('load_logs', load_logs, path)
+        features = timed('extract_features', extract_features, df)
+        timed('add_department_access_features', add_department_access_features, df, features.copy())
+        results = timed('detect_anomalies', detect_anomalies, features)
+        timed('write_outputs', write_outputs, results)
+
+    stages = [
+        {key: stage[key] for key in ['stage', 'wall_s', 'cpu_s', 'peak_rss_mb']}
+        for stage in recorder.stages
+    ]
+    return {'events': len(df), 'entities': len(features), 'stages': stages}
+
+def run_benchmarks(event_counts, user_counts, seed=42, data_dir=DATA_DIR):
+    results = []
+    # Each dataset runs in a fresh interpreter so peak RSS is not shared between runs
+    context = multiprocessing.get_context('spawn')
+    for events in event_counts:
+        for users in user_counts:
+            path = dataset_path(events, users, seed, data_dir)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                run = pool.submit(run_stages, path).result()
+            for stage in run['stages']:
+                results.append({'events_target': events, 'users': users, 'events': run['events'], **stage})
+                print(f"{events:>12} events {users:>8} users  {stage['stage']:<32} "
+                      f"{stage['wall_s']:>9.3f}s  {stage['peak_rss_mb']:>9.1f} MB")
+    return results
+
+def compare(results, baseline, tolerance):
+    """Stages that got slower than the baseline by more than `tolerance` (a fraction)"""
+    reference = {(r['events_target'], r['users'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        base = reference.get((r['events_target'], r['users'], r['stage']))
+        if base and r['wall_s'] > base['wall_s'] * (1 + tolerance):
+            regressions.append({**r, 'baseline_wall_s': base['wall_s']})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the detection pipeline")
+    parser.add_argument('--events', type=float, nargs='+', default=[1e4, 1e5, 1e6],
+                        help="Target event counts, up to 1e8")
+    parser.add_argument('--users', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', help="Baseline results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    import numpy, pandas, sklearn
+    results = run_benchmarks([int(e) for e in args.events], args.users, args.seed, args.data_dir)
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'pandas': pandas.__version__,
+            'numpy': numpy.__version__,
+            'scikit-learn': sklearn.__version__,
+            'cpu_count': os.cpu_count(),
+            'platform': platform.platform()
+        },
+        'results': results
+    }
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['stage']} at {r['events_target']} events / {r['users']} users: "
+                  f"{r['wall_s']:.3f}s vs baseline {r['baseline_wall_s']:.3f}s")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Startup cost of the command line entry point.
+
+Times `python main.py <command> --help` for every subcommand in fresh
+interpreters, checks the result against a per-command budget, and checks
+that importing main does not pull in any heavy dependency. Exits non-zero
+when a budget is exceeded, so it can run as a CI gate:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --budget 0.5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = ['run', 'generate', 'features', 'train', 'score', 'report']
+
+# Seconds allowed for an interpreter to start and print a command's help
+STARTUP_BUDGET = 0.5
+
+# Modules that must not be imported just by loading main.py
+HEAVY_MODULES = ['pandas', 'numpy', 'sklearn', 'requests', 'dotenv', 'colorama', 'pyarrow', 'joblib']
+
+def startup_time(args, repeat):
+    """Median wall time of `python main.py <args>` over `repeat` fresh runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'main.py', *args], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def heavy_imports():
+    """Heavy modules present in sys.modules after `import main`"""
+    code = ("import sys, main; "
+            f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True)
+    return result.stdout.split()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup time of main.py subcommands")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                        help="Seconds allowed per command")
+    args = parser.parse_args()
+
+    failures = []
+    baseline = startup_time(['--help'], args.repeat)
+    print(f"{'--help':<12} {baseline:>7.3f}s")
+    for command in COMMANDS:
+        elapsed = startup_time([command, '--help'], args.repeat)
+        status = 'ok' if elapsed <= args.budget else 'OVER BUDGET'
+        print(f"{command:<12} {elapsed:>7.3f}s  {status}")
+        if elapsed > args.budget:
+            failures.append(command)
+
+    imported = heavy_imports()
+    if imported:
+        print(f"import main loads heavy modules: {', '.join(imported)}")
+        failures.append('import main')
+
+    if failures:
+        sys.exit(1)
+    print(f"All commands start within {args.budget:.2f}s")
+
+if __name__ == '__main__':
+    main()
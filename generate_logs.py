@@ -1,8 +1,57 @@
 import pandas as pd
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, time
+import argparse
 import os
 
+DEPARTMENTS = ['IT', 'HR', 'Finance', 'Marketing', 'Sales', 'Engineering', 'Executive']
+EVENTS = ['login', 'file_access', 'email', 'usb_usage']
+
+# Resources normal users of each department work with
+DEPT_RESOURCES = {
+    'IT': ['server_logs', 'network_configs', 'system_backups'],
+    'HR': ['employee_records', 'hiring_docs', 'benefits_info'],
+    'Finance': ['invoices', 'budget_reports', 'expense_claims'],
+    'Marketing': ['campaign_assets', 'market_research', 'brand_guidelines'],
+    'Sales': ['customer_data', 'sales_reports', 'lead_lists'],
+    'Engineering': ['product_specs', 'code_repos', 'design_docs'],
+    'Executive': ['board_minutes', 'strategy_docs', 'performance_reviews']
+}
+
+# Suspicious user templates: (user name, department, label)
+SUSPICIOUS_USERS = [
+    ('suspicious_downloader', 'Finance', 'mass_downloader'),
+    ('suspicious_offhours', 'IT', 'off_hours_access'),
+    ('admin_suspicious', 'IT', 'privilege_abuse'),
+    ('hr_suspicious', 'HR', 'data_snooping')
+]
+
+# Behaviour of each label, matching generate_log_data. `logs` is the range of
+# events per user per week, `hours` the range of hours events happen in
+# (None = any time), `events` the event types and their probabilities, and
+# `resources` the resources file accesses pick from (None = own department's).
+PROFILES = {
+    'mass_downloader': dict(logs=(30, 50), hours=None,
+                            events=(['login', 'file_access'], [0.1, 0.9]),
+                            file_size=(50000, 200000), resources=['financial_reports']),
+    'off_hours_access': dict(logs=(50, 100), hours=(22, 28),
+                             events=(EVENTS, None),
+                             file_size=(100, 20000), resources=['server_logs']),
+    'privilege_abuse': dict(logs=(70, 120), hours=(9, 18),
+                            events=(['login', 'file_access'], [0.2, 0.8]),
+                            file_size=(100, 5000),
+                            resources=['payroll_data', 'employee_reviews', 'salary_info', 'hr_database']),
+    'data_snooping': dict(logs=(80, 150), hours=(9, 18),
+                          events=(EVENTS, [0.3, 0.5, 0.1, 0.1]),
+                          file_size=(100, 3000),
+                          resources=['executive_meeting_notes', 'strategic_plans', 'acquisition_plans']),
+    'normal': dict(logs=(100, 300), hours=(9, 18),
+                   events=(EVENTS, [0.4, 0.3, 0.2, 0.1]),
+                   file_size=(100, 20000), resources=None)
+}
+
 def generate_log_data(num_users=10, days=7, output_path='data/simulated_logs.csv'):
     np.random.seed(42)
     
@@ -196,5 +245,175 @@ def generate_log_data(num_users=10, days=7, output_path='data/simulated_logs.csv
     labels_df.to_csv('data/user_labels.csv', index=False)
     print(f"[✔] User labels saved for supervised learning: data/user_labels.csv")
 
+def generate_log_data_fast(num_users=100_000, days=7, output_path='data/simulated_logs.parquet',
+                           users_per_chunk=1000, num_workers=None, seed=42, start=None,
+                           suspicious_fraction=0.001):
+    """
+    Vectorized generator for large load-testing datasets.
+    Users are split into chunks of `users_per_chunk`. Each chunk's events are
+    drawn in bulk arrays per behaviour profile in a worker process and streamed
+    to `output_path` (.csv or .parquet) in user order. Every chunk has its own
+    seed derived from `seed`, so output does not depend on `num_workers`.
+    Pass a fixed `start` datetime for fully reproducible timestamps.
+    """
+    rng = np.random.default_rng(seed)
+    if start is None:
+        start = datetime.combine(datetime.now().date(), time()) - timedelta(days=days)
+
+    # User table: normal users with random departments, then suspicious users
+    users = [f'user_{i+1}' for i in range(num_users)]
+    depts = list(rng.choice(DEPARTMENTS, size=num_users))
+    labels = ['normal'] * num_users
+    per_profile = max(1, int(num_users * suspicious_fraction))
+    for name, dept, label in SUSPICIOUS_USERS:
+        for j in range(per_profile):
+            users.append(name if per_profile == 1 else f'{name}_{j+1}')
+            depts.append(dept)
+            labels.append(label)
+    users, depts, labels = np.array(users), np.array(depts), np.array(labels)
+
+    seeds = np.random.SeedSequence(seed).spawn((len(users) + users_per_chunk - 1) // users_per_chunk)
+    output_format = 'parquet' if output_path.endswith('.parquet') else 'csv'
+    tasks = [
+        (users[i:i + users_per_chunk], depts[i:i + users_per_chunk], labels[i:i + users_per_chunk],
+         days, np.datetime64(start, 'us'), chunk_seed, output_format)
+        for i, chunk_seed in zip(range(0, len(users), users_per_chunk), seeds)
+    ]
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    writer = _ChunkWriter(output_path, output_format)
+    total = 0
+    try:
+        if num_workers == 1:
+            for task in tasks:
+                total += writer.write(*_encoded_chunk(task))
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                # Bound the chunks held in memory while keeping every worker busy
+                window = 2 * (num_workers or os.cpu_count() or 1)
+                in_flight = deque()
+                for task in tasks:
+                    in_flight.append(pool.submit(_encoded_chunk, task))
+                    if len(in_flight) >= window:
+                        total += writer.write(*in_flight.popleft().result())
+                while in_flight:
+                    total += writer.write(*in_flight.popleft().result())
+    finally:
+        writer.close()
+    print(f"[✔] Log data generated: {output_path} ({total} events, {len(users)} users)")
+
+    labels_path = os.path.join(os.path.dirname(output_path) or '.', 'user_labels.csv')
+    pd.DataFrame({'user': users, 'department': depts, 'label': labels}).to_csv(labels_path, index=False)
+    print(f"[✔] User labels saved for supervised learning: {labels_path}")
+
+def _encoded_chunk(task):
+    """
+    Worker entry point: generate one chunk and encode it for the writer, so
+    CSV formatting also runs in parallel. Returns (payload, number of rows).
+    """
+    chunk = _generate_chunk(*task[:-1])
+    if task[-1] == 'parquet':
+        return chunk.assign(resource=chunk['resource'].mask(chunk['resource'] == '')), len(chunk)
+    # Same ISO 8601 timestamps as generate_log_data
+    chunk = chunk.assign(timestamp=np.datetime_as_string(chunk['timestamp'].values, unit='us'))
+    return chunk.to_csv(header=False, index=False), len(chunk)
+
+def _generate_chunk(users, depts, labels, days, start, seed):
+    """Draw all events for one chunk of users, grouped by user in chunk order"""
+    rng = np.random.default_rng(seed)
+    scale = days / 7
+
+    frames = []
+    for label, profile in PROFILES.items():
+        positions = np.flatnonzero(labels == label)
+        if len(positions) == 0:
+            continue
+
+        # Number of events per user, scaled to the length of the window
+        low, high = profile['logs']
+        low, high = max(1, int(low * scale)), max(2, int(high * scale))
+        counts = rng.integers(low, high, size=len(positions))
+        rows = np.repeat(positions, counts)
+        n = len(rows)
+
+        if profile['hours'] is None:
+            offsets = rng.integers(0, days * 24 * 3600, size=n).astype('timedelta64[s]')
+        else:
+            day = rng.integers(0, days, size=n)
+            hour = rng.integers(*profile['hours'], size=n) % 24
+            minute = rng.integers(0, 60, size=n)
+            offsets = ((day * 24 + hour) * 60 + minute).astype('timedelta64[m]')
+
+        event_choices, event_p = profile['events']
+        event_type = rng.choice(np.array(event_choices), size=n, p=event_p)
+        is_file = event_type == 'file_access'
+
+        file_size = pd.array(rng.integers(*profile['file_size'], size=n), dtype='Int64')
+        file_size[~is_file] = pd.NA
+
+        if profile['resources'] is None:
+            dept_resources = np.array([DEPT_RESOURCES[d] for d in DEPARTMENTS])
+            dept_codes = pd.Categorical(depts[rows], categories=DEPARTMENTS).codes
+            resource = dept_resources[dept_codes, rng.integers(0, 3, size=n)]
+        else:
+            resource = rng.choice(np.array(profile['resources']), size=n)
+        resource = np.where(is_file, resource, '')
+
+        frames.append(pd.DataFrame({
+            'position': rows,
+            'user': users[rows],
+            'department': depts[rows],
+            'timestamp': start + offsets,
+            'event_type': event_type,
+            'file_size': file_size,
+            'resource': resource,
+            'label': labels[rows]
+        }))
+
+    chunk = pd.concat(frames, ignore_index=True)
+    chunk = chunk.sort_values('position', kind='stable', ignore_index=True)
+    return chunk.drop(columns='position')
+
+class _ChunkWriter:
+    """Appends encoded chunks to a single CSV or Parquet file"""
+
+    def __init__(self, path, output_format):
+        self.path = path
+        self.output_format = output_format
+        self.writer = None
+        if output_format == 'csv':
+            self.file = open(path, 'w', newline='')
+            self.file.write('user,department,timestamp,event_type,file_size,resource,label\n')
+
+    def write(self, payload, rows):
+        if self.output_format == 'csv':
+            self.file.write(payload)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(payload, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        return rows
+
+    def close(self):
+        if self.output_format == 'csv':
+            self.file.close()
+        elif self.writer is not None:
+            self.writer.close()
+
 if __name__ == "__main__":
-    generate_log_data()
+    parser = argparse.ArgumentParser(description="Generate simulated user activity logs")
+    parser.add_argument('--users', type=int, help="Use the vectorized generator with this many normal users")
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--output', default='data/simulated_logs.csv', help="Output .csv or .parquet file")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.users is None:
+        generate_log_data(days=args.days, output_path=args.output)
+    else:
+        generate_log_data_fast(num_users=args.users, days=args.days, output_path=args.output,
+                               num_workers=args.workers, seed=args.seed)
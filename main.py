@@ -1,178 +1,306 @@
-from src.ingest import load_logs
-from src.feature_engineer import extract_features
-from src.model import detect_anomalies
-from src.ai_explainer import explain_anomaly
-import json
+import argparse
 import os
-import pandas as pd
-from colorama import Fore, Back, Style, init
-
-# Initialize colorama
-init(autoreset=True)
-
-def format_file_size(size_bytes):
-    """Format bytes to human-readable format with appropriate units"""
-    if size_bytes == 0:
-        return "0 B"
-        
-    units = ['B', 'KB', 'MB', 'GB', 'TB']
-    i = 0
-    while size_bytes >= 1024 and i < len(units) - 1:
-        size_bytes /= 1024
-        i += 1
-    
-    # Use whole numbers if the value is large enough
-    if size_bytes >= 100:
-        return f"{int(size_bytes)} {units[i]}"
-    else:
-        return f"{size_bytes:.1f} {units[i]}"
+import sys
+
+# Heavy dependencies (pandas, scikit-learn, requests, colorama) are imported
+# inside the commands that need them, so short invocations start quickly
+
+PIPELINE_STAGES = ['generate', 'load', 'features', 'peer', 'similarity', 'detect', 'explain', 'save', 'print']
+
+LOG_PATH = 'data/simulated_logs.csv'
+FEATURES_PATH = 'outputs/features.feather'
+ANOMALIES_PATH = 'outputs/anomalies.ndjson'
+BACKTEST_PATH = 'outputs/backtest.csv'
+
+def main(profile_stage=None, profile_mode='cprofile', generate=False, log_path=LOG_PATH,
+         output_path=ANOMALIES_PATH, top_k=20, page=1, peer=False, similarity=False):
+    """Run the whole pipeline. Log data is only generated on request or when missing."""
+    from src.cache import extract_features_cached, file_digest, load_logs_cached
+    from src.model import detect_anomalies
+    from src.report import print_report, write_results
+    from src.ai_explainer import explain_anomalies
+    from src.explanation_cache import ExplanationCache
+    from src.instrumentation import StageRecorder
+    from colorama import Fore, Style, init
+
+    # Initialize colorama
+    init(autoreset=True)
 
-def main():
     # Ensure outputs directory exists
     os.makedirs('outputs', exist_ok=True)
+    recorder = StageRecorder(profile_stage, profile_mode)
     
     # Run log generation
-    print(f"{Fore.CYAN}Generating log data...{Style.RESET_ALL}")
-    from generate_logs import generate_log_data
-    generate_log_data()
+    if generate or not os.path.exists(log_path):
+        print(f"{Fore.CYAN}Generating log data...{Style.RESET_ALL}")
+        with recorder.stage('generate'):
+            from generate_logs import generate_log_data
+            generate_log_data(output_path=log_path)
+
+    # Parsed logs and features are cached by the content hash of the log file
+    digest = file_digest(log_path)
 
     print(f"{Fore.CYAN}Loading logs...{Style.RESET_ALL}")
-    df = load_logs('data/simulated_logs.csv')
+    with recorder.stage('load') as stage:
+        df = load_logs_cached(log_path, digest=digest)
+        stage['rows_out'] = len(df)
 
     print(f"{Fore.CYAN}Extracting features...{Style.RESET_ALL}")
-    features = extract_features(df)
+    with recorder.stage('features', rows_in=len(df)) as stage:
+        features = extract_features_cached(log_path, df, digest=digest)
+        stage['rows_out'] = len(features)
+
+    if peer:
+        from src.peer_baseline import add_peer_features, compute_peer_baselines, save_peer_baselines
+        print(f"{Fore.CYAN}Comparing users to their department peers...{Style.RESET_ALL}")
+        with recorder.stage('peer', rows_in=len(features)) as stage:
+            baseline = compute_peer_baselines(features)
+            save_peer_baselines(baseline)
+            features = add_peer_features(features, baseline)
+            stage['rows_out'] = len(features)
+
+    if similarity:
+        from src.peer_similarity import add_peer_similarity_features, build_peer_index, save_peer_index
+        print(f"{Fore.CYAN}Scoring users against their nearest peers...{Style.RESET_ALL}")
+        with recorder.stage('similarity', rows_in=len(features)) as stage:
+            index = build_peer_index(df)
+            save_peer_index(index)
+            features = add_peer_similarity_features(df, features, index)
+            stage['rows_out'] = int((features['peer_anomaly_score'] == -1).sum())
 
     print(f"{Fore.CYAN}Detecting anomalies...{Style.RESET_ALL}")
-    results = detect_anomalies(features)
+    with recorder.stage('detect', rows_in=len(features)) as stage:
+        # Threat and importance tables are kept in memory for the report
+        results, details = detect_anomalies(features, return_details=True)
 
-    # Identify suspicious users
-    anomalies = results[results['anomaly_score'] == -1].copy()
+        # Identify suspicious users
+        anomalies = results[results['anomaly_score'] == -1].copy()
+        stage['rows_out'] = len(anomalies)
     
     # Optionally get AI explanations
     print(f"{Fore.CYAN}Generating AI explanations...{Style.RESET_ALL}")
-    anomalies['explanation'] = anomalies.apply(lambda row: explain_anomaly(row.to_dict()), axis=1)
+    with recorder.stage('explain', rows_in=len(anomalies)) as stage:
+        explanation_cache = ExplanationCache()
+        anomalies['explanation'] = explain_anomalies(anomalies.to_dict('records'), cache=explanation_cache)
+        cache_stats = explanation_cache.stats()
+        explanation_cache.close()
+        stage['rows_out'] = len(anomalies)
+        stage['explanation_cache'] = cache_stats
+    print(f"Explanation cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+          f"{cache_stats['misses']} misses")
 
     print(f"{Fore.CYAN}Saving results...{Style.RESET_ALL}")
-    anomalies.to_json('outputs/anomalies.json', orient='records', indent=2)
+    with recorder.stage('save', rows_in=len(anomalies)) as stage:
+        write_results(anomalies, output_path)
+        stage['rows_out'] = len(anomalies)
     
-    # Print summary of suspicious behaviors
-    print(f"\n{Back.RED}{Fore.WHITE} ===== DETECTION RESULTS ===== {Style.RESET_ALL}")
-    if len(anomalies) > 0:
-        print(f"{Fore.YELLOW}Found {Fore.RED}{len(anomalies)}{Fore.YELLOW} suspicious users:{Style.RESET_ALL}")
-        for _, row in anomalies.iterrows():
-            # Assign colors based on threat type
-            threat_color = Fore.RED  # Default
-            if 'label' in row:
-                if row['label'] == 'mass_downloader':
-                    threat_color = Fore.RED
-                elif row['label'] == 'off_hours_access':
-                    threat_color = Fore.MAGENTA
-                elif row['label'] == 'privilege_abuse':
-                    threat_color = Fore.YELLOW
-                elif row['label'] == 'data_snooping':
-                    threat_color = Fore.BLUE
-            
-            print(f"- {Fore.LIGHTWHITE_EX}{row['user']}{Style.RESET_ALL} (Department: {Fore.GREEN}{row['department']}{Style.RESET_ALL})")
-            
-            # Show the threat type if using supervised learning
-            if 'label' in row and row['label'] != 'normal':
-                print(f"  {Fore.WHITE}Threat type: {threat_color}{row['label']}{Style.RESET_ALL}")
-                
-            max_size = row.get('max_file_size', 0)
-            total_size = row.get('total_file_size', 0)
-            off_hours = row.get('offhours_access_pct', 0)
-            cross_dept = row.get('cross_dept_access_pct', 0)
-            sensitive = row.get('sensitive_resource_pct', 0)
-            
-            print(f"  {Fore.WHITE}Max file size:{Style.RESET_ALL} {max_size} bytes ({Fore.CYAN}{format_file_size(max_size)}{Style.RESET_ALL})")
-            
-            # Color-code percentages based on severity
-            off_color = Fore.GREEN
-            if off_hours > 50:
-                off_color = Fore.RED
-            elif off_hours > 20:
-                off_color = Fore.YELLOW
-                
-            cross_color = Fore.GREEN
-            if cross_dept > 50:
-                cross_color = Fore.RED
-            elif cross_dept > 20:
-                cross_color = Fore.YELLOW
-                
-            sensitive_color = Fore.GREEN
-            if sensitive > 50:
-                sensitive_color = Fore.RED
-            elif sensitive > 20:
-                sensitive_color = Fore.YELLOW
-            
-            print(f"  {Fore.WHITE}Off-hours access:{Style.RESET_ALL} {off_color}{off_hours:.1f}%{Style.RESET_ALL} of activity")
-            print(f"  {Fore.WHITE}Cross-department access:{Style.RESET_ALL} {cross_color}{cross_dept:.1f}%{Style.RESET_ALL} of file access")
-            print(f"  {Fore.WHITE}Sensitive resource access:{Style.RESET_ALL} {sensitive_color}{sensitive:.1f}%{Style.RESET_ALL} of file access")
-            print(f"  {Fore.WHITE}Total data transferred:{Style.RESET_ALL} {total_size} bytes ({Fore.CYAN}{format_file_size(total_size)}{Style.RESET_ALL})")
-            
-            # Show anomaly probability if available (from supervised learning)
-            if 'anomaly_prob' in row:
-                confidence = row['anomaly_prob']*100
-                conf_color = Fore.GREEN
-                if confidence > 90:
-                    conf_color = Fore.RED
-                elif confidence > 70:
-                    conf_color = Fore.YELLOW
-                    
-                print(f"  {Fore.WHITE}Confidence score:{Style.RESET_ALL} {conf_color}{confidence:.1f}%{Style.RESET_ALL}")
-            
+    with recorder.stage('print', rows_in=len(anomalies)):
+        print_report(anomalies, details['threat_analysis'], details['feature_importances'],
+                     top_k, page)
+
+    metrics_path = recorder.write()
+    print(f"Stage metrics saved to {metrics_path}")
+
+def generate_command(args):
+    if args.users is None:
+        from generate_logs import generate_log_data
+        generate_log_data(days=args.days, output_path=args.output)
     else:
-        print(f"{Fore.GREEN}No suspicious users detected.{Style.RESET_ALL}")
-    print(f"{Back.RED}{Fore.WHITE} ============================= {Style.RESET_ALL}")
-    
-    # Check if we're using supervised learning and have threat analysis
-    threat_analysis_path = 'outputs/threat_analysis.csv'
-    if os.path.exists(threat_analysis_path):
-        threat_df = pd.read_csv(threat_analysis_path)
-        print(f"\n{Back.BLUE}{Fore.WHITE} ===== THREAT TYPE ANALYSIS ===== {Style.RESET_ALL}")
-        for _, row in threat_df.iterrows():
-            user = row['user']
-            predicted_threat = row['predicted_threat']
-            
-            # Get the probability columns
-            prob_columns = [c for c in row.index if c.startswith('prob_')]
-            
-            print(f"{Fore.LIGHTWHITE_EX}User: {Fore.YELLOW}{user}{Style.RESET_ALL}")
-            print(f"  {Fore.WHITE}Predicted threat type: {Fore.RED}{predicted_threat}{Style.RESET_ALL}")
-            print(f"  {Fore.WHITE}Threat probabilities:{Style.RESET_ALL}")
-            for col in prob_columns:
-                threat_type = col.replace('prob_', '')
-                prob_value = row[col]*100
-                
-                # Color based on probability
-                prob_color = Fore.GREEN
-                if prob_value > 60:
-                    prob_color = Fore.RED
-                elif prob_value > 30:
-                    prob_color = Fore.YELLOW
-                    
-                print(f"    - {Fore.CYAN}{threat_type}:{Style.RESET_ALL} {prob_color}{prob_value:.1f}%{Style.RESET_ALL}")
-            print()
-        print(f"{Back.BLUE}{Fore.WHITE} ================================ {Style.RESET_ALL}")
-    
-    # Check if we have feature importance analysis
-    feature_imp_path = 'outputs/feature_importances.csv'
-    if os.path.exists(feature_imp_path):
-        importance_df = pd.read_csv(feature_imp_path)
-        print(f"\n{Back.GREEN}{Fore.BLACK} ===== TOP FEATURES FOR DETECTION ===== {Style.RESET_ALL}")
-        for _, row in importance_df.head(5).iterrows():
-            feature_name = row['feature']
-            importance = row['importance']
-            
-            # Gradient of colors based on importance
-            imp_color = Fore.GREEN
-            if importance > 0.3:
-                imp_color = Fore.RED
-            elif importance > 0.1:
-                imp_color = Fore.YELLOW
-                
-            print(f"- {Fore.CYAN}{feature_name}:{Style.RESET_ALL} {imp_color}{importance:.4f}{Style.RESET_ALL}")
-        print(f"{Back.GREEN}{Fore.BLACK} ====================================== {Style.RESET_ALL}")
+        from generate_logs import generate_log_data_fast
+        generate_log_data_fast(num_users=args.users, days=args.days, output_path=args.output, seed=args.seed)
+
+def features_command(args):
+    """Extract features from a log file, or a glob or directory of log files, and store them as Feather"""
+    df = None
+    if not os.path.isfile(args.logs):
+        # Hourly (possibly compressed) CSV/JSONL files are parsed in a worker pool
+        from src.feature_engineer import extract_features
+        from src.ingest import EVENT_COLUMNS, load_sources
+        columns = EVENT_COLUMNS + ['label'] if args.labels else EVENT_COLUMNS
+        df = load_sources(args.logs, columns, max_workers=args.workers)
+        features = extract_features(df, args.windows)
+    elif args.workers:
+        from src.sharding import extract_features_sharded
+        features = extract_features_sharded(args.logs, max_workers=args.workers, windows=args.windows)
+    elif args.windows:
+        from src.cache import load_logs_cached
+        from src.feature_engineer import extract_features
+        features = extract_features(load_logs_cached(args.logs), args.windows)
+    else:
+        from src.cache import extract_features_cached
+        features = extract_features_cached(args.logs)
+
+    if args.learned_access or args.access_baseline:
+        from src.cache import load_logs_cached
+        from src.resource_matrix import (
+            add_learned_access_features, learn_access_baseline, load_access_baseline, save_access_baseline
+        )
+        if df is None:
+            df = load_logs_cached(args.logs)
+        if args.access_baseline:
+            baseline = load_access_baseline(args.access_baseline)
+        else:
+            baseline = learn_access_baseline(df, features)
+            save_access_baseline(baseline)
+        features = add_learned_access_features(df, features, baseline)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    features.to_feather(args.output)
+    print(f"Features for {len(features)} users saved to {args.output}")
+
+def train_command(args):
+    import pandas as pd
+    from src.model import MODEL_PATH, train
+
+    features = pd.read_feather(args.features)
+    peer_baseline = None
+    if args.peer:
+        from src.peer_baseline import compute_peer_baselines
+        peer_baseline = compute_peer_baselines(features)
+    train(features, args.model or MODEL_PATH, peer_baseline=peer_baseline, sample_size=args.sample_size)
+
+def score_command(args):
+    """Score stored features with a trained model and save the anomalous users"""
+    import pandas as pd
+    from src.model import MODEL_PATH, load_model, predict_threats, score, score_chunked
+    from src.report import write_results
+
+    artifact = load_model(args.model or MODEL_PATH)
+    features = pd.read_feather(args.features)
+    if args.workers:
+        results = score_chunked(features, artifact, max_workers=args.workers, threshold=args.threshold)
+    else:
+        results = score(features, artifact)
+    anomalies = results[results['anomaly_score'] == -1].copy()
+
+    # Keep the side tables the report reads in step with this model
+    os.makedirs('outputs', exist_ok=True)
+    if artifact['feature_importances'] is not None:
+        artifact['feature_importances'].to_csv('outputs/feature_importances.csv', index=False)
+    threat_df = predict_threats(results, artifact)
+    if threat_df is not None:
+        threat_df.to_csv('outputs/threat_analysis.csv', index=False)
+
+    if args.explain:
+        from src.ai_explainer import explain_anomalies
+        from src.explanation_cache import ExplanationCache
+        explanation_cache = ExplanationCache()
+        anomalies['explanation'] = explain_anomalies(anomalies.to_dict('records'), cache=explanation_cache)
+        explanation_cache.close()
+
+    write_results(anomalies, args.output)
+    print(f"{len(anomalies)} anomalous users saved to {args.output}")
+
+def report_command(args):
+    """Print the console report from saved results and the side tables written next to them"""
+    import pandas as pd
+    from src.report import print_report, read_results
+
+    tables = {}
+    for name in ['threat_analysis', 'feature_importances']:
+        path = os.path.join('outputs', f'{name}.csv')
+        tables[name] = pd.read_csv(path) if os.path.exists(path) else None
+    print_report(read_results(args.anomalies), tables['threat_analysis'], tables['feature_importances'],
+                 args.top, args.page)
+
+def backtest_command(args):
+    """Evaluate the model over rolling train/test windows of a labelled log"""
+    from src.backtest import backtest, summarize
+
+    results = backtest(args.logs, args.train_days, args.test_days, args.step_days, args.workers)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    results.to_csv(args.output, index=False)
+
+    by_label, runtimes = summarize(results)
+    print("\nMean precision and recall across folds:")
+    print(by_label.round(3).to_string())
+    print("\nFold runtimes:")
+    print(runtimes.round({'runtime_s': 2}).to_string())
+    print(f"\nPer-fold results saved to {args.output}")
+
+def run_command(args):
+    main(args.profile_stage, args.profile_mode, args.generate, args.logs, args.output, args.top, args.page, args.peer,
+         args.similarity)
+
+def build_parser():
+    from src.instrumentation import PROFILE_MODES
+
+    parser = argparse.ArgumentParser(description="Insider threat detection pipeline")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    run = commands.add_parser('run', help="Run the whole pipeline (the default)")
+    run.add_argument('--generate', action='store_true', help="Regenerate the simulated logs first")
+    run.add_argument('--logs', default=LOG_PATH)
+    run.add_argument('--profile-stage', choices=PIPELINE_STAGES,
+                     help="Run this stage under a profiler and dump the profile to outputs/")
+    run.add_argument('--profile-mode', choices=PROFILE_MODES, default='cprofile')
+    run.add_argument('--peer', action='store_true', help="Add deviation-from-department-peers features")
+    run.add_argument('--similarity', action='store_true',
+                     help="Add the distance to each user's nearest peers by resource and event profile")
+    run.add_argument('--output', default=ANOMALIES_PATH, help="Results file (.ndjson, .parquet or .json)")
+    run.add_argument('--top', type=int, default=20, help="Users per report page")
+    run.add_argument('--page', type=int, default=1)
+    run.set_defaults(handler=run_command)
+
+    generate = commands.add_parser('generate', help="Generate simulated log data")
+    generate.add_argument('--users', type=int, help="Use the vectorized generator with this many normal users")
+    generate.add_argument('--days', type=int, default=7)
+    generate.add_argument('--seed', type=int, default=42)
+    generate.add_argument('--output', default=LOG_PATH)
+    generate.set_defaults(handler=generate_command)
+
+    features = commands.add_parser('features', help="Extract per-user features from a log file")
+    features.add_argument('--logs', default=LOG_PATH,
+                          help="Log file, or a glob or directory of .csv/.jsonl files (optionally .gz, .bz2, .xz, .zst)")
+    features.add_argument('--labels', action='store_true', help="Keep the label column when reading several files")
+    features.add_argument('--output', default=FEATURES_PATH)
+    features.add_argument('--windows', nargs='+', help="Also add burst features over these windows, e.g. 1h 24h")
+    features.add_argument('--workers', type=int, help="Extract user-hash shards in this many processes")
+    features.add_argument('--learned-access', action='store_true',
+                          help="Add cross-department and rare-resource shares learned from the logs "
+                               "(the baseline is saved to models/access_baseline.joblib)")
+    features.add_argument('--access-baseline', help="Add the learned access features using this saved baseline")
+    features.set_defaults(handler=features_command)
+
+    train = commands.add_parser('train', help="Train a model artifact from stored features")
+    train.add_argument('--features', default=FEATURES_PATH)
+    train.add_argument('--model', help="Artifact path (default: models/insider_threat_model.joblib)")
+    train.add_argument('--peer', action='store_true',
+                       help="Add deviation-from-department-peers features and store the baselines in the artifact")
+    train.add_argument('--sample-size', type=int,
+                       help="Fit the unsupervised model on a reservoir sample of this many users")
+    train.set_defaults(handler=train_command)
+
+    score = commands.add_parser('score', help="Score stored features with a trained model")
+    score.add_argument('--features', default=FEATURES_PATH)
+    score.add_argument('--model', help="Artifact path (default: models/insider_threat_model.joblib)")
+    score.add_argument('--output', default=ANOMALIES_PATH, help="Results file (.ndjson, .parquet or .json)")
+    score.add_argument('--explain', action='store_true', help="Add AI explanations to the anomalies")
+    score.add_argument('--workers', type=int, help="Score in chunks across this many processes")
+    score.add_argument('--threshold', type=float, default=0.0,
+                       help="Isolation Forest decision score below which users are flagged (with --workers)")
+    score.set_defaults(handler=score_command)
+
+    report = commands.add_parser('report', help="Print the console report for saved anomalies")
+    report.add_argument('--anomalies', default=ANOMALIES_PATH)
+    report.add_argument('--top', type=int, default=20, help="Users per page")
+    report.add_argument('--page', type=int, default=1)
+    report.set_defaults(handler=report_command)
+
+    backtest = commands.add_parser('backtest', help="Evaluate over rolling train/test windows of a labelled log")
+    backtest.add_argument('--logs', default=LOG_PATH)
+    backtest.add_argument('--train-days', type=int, default=4)
+    backtest.add_argument('--test-days', type=int, default=1)
+    backtest.add_argument('--step-days', type=int, default=1)
+    backtest.add_argument('--workers', type=int, help="Run folds in this many processes (default: all cores)")
+    backtest.add_argument('--output', default=BACKTEST_PATH)
+    backtest.set_defaults(handler=backtest_command)
+    return parser
 
 if __name__ == '__main__':
-    main()
+    argv = sys.argv[1:]
+    # Without a command, run the whole pipeline (python main.py --profile-stage ...)
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    args = build_parser().parse_args(argv)
+    args.handler(args)
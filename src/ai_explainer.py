@@ -1,35 +1,122 @@
 import requests
 import os
+import time
 import dotenv
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 dotenv.load_dotenv()
 
-def explain_anomaly(user_data):
+# Point DEEPSEEK_API_URL at src/explainer_stub.py to run without the remote API
+API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/generate")
+
+# Batch explanation defaults
+MAX_CONCURRENCY = 8
+REQUEST_TIMEOUT = 10  # seconds per request
+TOTAL_TIMEOUT = 60    # seconds for the whole batch
+MAX_RETRIES = 2
+
+def explain_anomaly(user_data, session=None, timeout=None, url=None):
     try:
-        url = "https://api.deepseek.com/v1/generate"
-        headers = {
-            "Authorization": os.getenv("DEEPSEEK_API_KEY"),
-            "Content-Type": "application/json"
-        }
-        prompt = f"Explain why this user's behavior is anomalous: {user_data}"
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [{"role": "user", "content": prompt}]
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-        return response.json()['choices'][0]['message']['content']
+        return request_explanation(user_data, session, timeout, url)
     except Exception as e:
         # If API call fails, provide a basic explanation based on data
-        explanation = "Potential suspicious behavior detected: "
-        
-        if 'max_file_size' in user_data and user_data['max_file_size'] > 50000:
-            explanation += f"Unusually large file downloads ({user_data['max_file_size']} bytes). "
-            
-        if 'offhours_access_pct' in user_data and user_data['offhours_access_pct'] > 10:
-            explanation += f"Significant off-hours activity ({user_data['offhours_access_pct']:.2f}%). "
-            
-        if 'total_file_size' in user_data and user_data['total_file_size'] > 500000:
-            explanation += f"High volume of data transferred ({user_data['total_file_size']} bytes)."
-            
-        return explanation
+        return rule_based_explanation(user_data)
+
+def request_explanation(user_data, session=None, timeout=None, url=None):
+    """Ask the API for an explanation; raises if the request fails"""
+    url = url or API_URL
+    headers = {
+        "Authorization": os.getenv("DEEPSEEK_API_KEY"),
+        "Content-Type": "application/json"
+    }
+    prompt = f"Explain why this user's behavior is anomalous: {user_data}"
+    payload = {
+        "model": "deepseek-chat",
+        "messages": [{"role": "user", "content": prompt}]
+    }
+
+    response = (session or requests).post(url, headers=headers, json=payload, timeout=timeout)
+    return response.json()['choices'][0]['message']['content']
+
+def rule_based_explanation(user_data):
+    """Explanation built from feature thresholds, used when the API is unavailable"""
+    explanation = "Potential suspicious behavior detected: "
+
+    if 'max_file_size' in user_data and user_data['max_file_size'] > 50000:
+        explanation += f"Unusually large file downloads ({user_data['max_file_size']} bytes). "
+
+    if 'offhours_access_pct' in user_data and user_data['offhours_access_pct'] > 10:
+        explanation += f"Significant off-hours activity ({user_data['offhours_access_pct']:.2f}%). "
+
+    if 'total_file_size' in user_data and user_data['total_file_size'] > 500000:
+        explanation += f"High volume of data transferred ({user_data['total_file_size']} bytes)."
+
+    return explanation
+
+def make_session(max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+    """HTTP session whose connection pool fits `max_concurrency` requests, with a bounded retry budget"""
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=None  # POST is retried too
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def explain_anomalies(records, max_concurrency=MAX_CONCURRENCY, request_timeout=REQUEST_TIMEOUT,
+                      total_timeout=TOTAL_TIMEOUT, max_retries=MAX_RETRIES, url=None, cache=None):
+    """
+    Explain a list of anomaly records concurrently over one pooled session.
+    At most `max_concurrency` requests are in flight, each request gets
+    `request_timeout` seconds, and anything unfinished after `total_timeout`
+    seconds falls back to the rule-based explanation. Results keep the
+    order of `records`. With an ExplanationCache, cached records skip the
+    API and successful API answers are stored.
+    """
+    explanations = [None] * len(records)
+    if cache is not None:
+        explanations = [cache.get(record) for record in records]
+    pending = [i for i, explanation in enumerate(explanations) if explanation is None]
+
+    if pending:
+        deadline = time.monotonic() + total_timeout
+        session = make_session(max_concurrency, max_retries)
+        pool = ThreadPoolExecutor(max_workers=max_concurrency)
+        try:
+            futures = {
+                pool.submit(_explain_before, records[i], session, request_timeout, deadline, url): i
+                for i in pending
+            }
+            done, _ = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+            for future in done:
+                i = futures[future]
+                explanations[i] = future.result()
+                if cache is not None and explanations[i] is not None:
+                    cache.put(records[i], explanations[i])
+        finally:
+            # Don't wait for requests still running past the deadline
+            pool.shutdown(wait=False, cancel_futures=True)
+            session.close()
+        if cache is not None:
+            cache.evict()
+
+    return [
+        explanation if explanation is not None else rule_based_explanation(record)
+        for explanation, record in zip(explanations, records)
+    ]
+
+def _explain_before(user_data, session, request_timeout, deadline, url):
+    """API explanation for one record, or None if it failed or the batch deadline passed"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    try:
+        return request_explanation(user_data, session, timeout=min(request_timeout, remaining), url=url)
+    except Exception:
+        return None
@@ -0,0 +1,156 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from sklearn.metrics import precision_recall_fscore_support
+from src.cache import CACHE_DIR, DEFAULT_MAX_BYTES, day_partitions, file_digest
+from src.feature_engineer import FEATURE_VERSION
+from src.feature_state import FeatureState
+from src.ingest import concat_events
+from src.model import predict_threats, score, train
+
+# Default location of the per-fold, per-label results
+BACKTEST_PATH = 'outputs/backtest.csv'
+
+# Rolling window lengths in days
+TRAIN_DAYS = 4
+TEST_DAYS = 1
+STEP_DAYS = 1
+
+# Row of the binary normal-vs-threat result in every fold
+ANY_THREAT = 'any_threat'
+
+# Prediction for flagged users when the model has no threat type classifier
+UNKNOWN_THREAT = 'unknown_threat'
+
+def day_states(file_path, cache_dir=CACHE_DIR, max_workers=None, max_bytes=DEFAULT_MAX_BYTES, digest=None):
+    """
+    Path of the cached FeatureState of every day in the log, keyed by day.
+    Days are taken from the day-partitioned event cache, and the states of
+    missing days are built in a process pool. FeatureStates merge by
+    addition, so any window's features come from merging its days' states
+    and no fold ever re-reads raw events.
+    """
+    digest = digest or file_digest(file_path)
+    partitions = day_partitions(file_path, cache_dir, max_bytes, digest)
+    state_dir = os.path.join(cache_dir, digest, f'states-v{FEATURE_VERSION}')
+    paths = {day: os.path.join(state_dir, f'day={day}.pkl') for day in partitions}
+
+    missing = [day for day, path in paths.items() if not os.path.exists(path)]
+    if missing:
+        print(f"Building feature state for {len(missing)} of {len(paths)} days")
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(_build_day_state, [partitions[day] for day in missing], [paths[day] for day in missing]))
+    return paths
+
+def rolling_folds(state_paths, train_days=TRAIN_DAYS, test_days=TEST_DAYS, step_days=STEP_DAYS):
+    """
+    Rolling train/test windows over the days in `state_paths`. Each fold
+    trains on `train_days` consecutive calendar days and tests on the
+    `test_days` that follow; windows advance by `step_days`.
+    """
+    days = pd.to_datetime(sorted(state_paths))
+    by_day = dict(zip(days, (state_paths[day] for day in sorted(state_paths))))
+
+    folds = []
+    start = days[0]
+    while start + pd.Timedelta(days=train_days + test_days - 1) <= days[-1]:
+        test_start = start + pd.Timedelta(days=train_days)
+        test_end = test_start + pd.Timedelta(days=test_days)
+        folds.append({
+            'fold': len(folds),
+            'train_start': start,
+            'test_start': test_start,
+            'test_end': test_end,
+            'train': [path for day, path in by_day.items() if start <= day < test_start],
+            'test': [path for day, path in by_day.items() if test_start <= day < test_end]
+        })
+        start += pd.Timedelta(days=step_days)
+    return folds
+
+def backtest(file_path, train_days=TRAIN_DAYS, test_days=TEST_DAYS, step_days=STEP_DAYS, max_workers=None,
+             cache_dir=CACHE_DIR):
+    """
+    Train on every rolling window of a labelled log and evaluate on the days
+    that follow. Folds run in parallel in a process pool over the shared
+    per-day feature states. Returns one row per fold and label with
+    precision, recall, support and the fold's runtime.
+    """
+    state_paths = day_states(file_path, cache_dir, max_workers)
+    folds = [fold for fold in rolling_folds(state_paths, train_days, test_days, step_days)
+             if fold['train'] and fold['test']]
+    if not folds:
+        raise ValueError(
+            f"{file_path} covers {len(state_paths)} days, fewer than the "
+            f"{train_days} training and {test_days} test days of one fold"
+        )
+
+    print(f"Backtesting {len(folds)} folds ({train_days}d train, {test_days}d test, {step_days}d step)")
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_run_fold, folds))
+    return pd.concat(results, ignore_index=True)
+
+def label_metrics(scored, artifact):
+    """
+    Precision, recall and support per true label of a scored test window.
+    Users scored as normal are predicted 'normal' and flagged users get the
+    threat type classifier's prediction. The any_threat row covers the
+    binary normal-vs-threat decision.
+    """
+    flagged = (scored['anomaly_score'] == -1).to_numpy()
+    predicted = pd.Series('normal', index=scored.index, dtype=object)
+    threats = predict_threats(scored, artifact)
+    predicted[flagged] = UNKNOWN_THREAT if threats is None else threats['predicted_threat'].to_numpy()
+
+    actual = scored['label'].astype(str)
+    labels = sorted(actual.unique())
+    precision, recall, _, support = precision_recall_fscore_support(
+        actual, predicted, labels=labels, zero_division=0
+    )
+    metrics = pd.DataFrame({'label': labels, 'precision': precision, 'recall': recall, 'support': support})
+
+    is_threat = (actual != 'normal').to_numpy()
+    any_precision, any_recall, _, _ = precision_recall_fscore_support(
+        is_threat, flagged, average='binary', zero_division=0
+    )
+    any_row = pd.DataFrame({'label': [ANY_THREAT], 'precision': [any_precision], 'recall': [any_recall],
+                            'support': [int(is_threat.sum())]})
+    return pd.concat([metrics, any_row], ignore_index=True)
+
+def summarize(results):
+    """Mean precision and recall per label across folds, and the runtime of every fold"""
+    by_label = results.groupby('label')[['precision', 'recall']].mean()
+    runtimes = results.drop_duplicates('fold').set_index('fold')[['test_start', 'runtime_s']]
+    return by_label, runtimes
+
+def _build_day_state(partition_paths, state_path):
+    """Process pool worker: fold one day's cached events into a FeatureState and pickle it"""
+    events = concat_events(pd.read_feather(path) for path in partition_paths)
+    state = FeatureState()
+    state.update(events)
+    state.save(state_path)
+
+def _merged_features(state_paths):
+    state = FeatureState.load(state_paths[0])
+    for path in state_paths[1:]:
+        state.merge(FeatureState.load(path))
+    return state.features()
+
+def _run_fold(fold):
+    """Process pool worker: train on the fold's training days and evaluate on its test days"""
+    start = time.perf_counter()
+    train_features = _merged_features(fold['train'])
+    test_features = _merged_features(fold['test'])
+    if 'label' not in train_features.columns:
+        raise ValueError("Backtesting needs labelled events")
+
+    # The pool already uses every core, so each model stays single-threaded
+    artifact = train(train_features, n_jobs=1)
+    metrics = label_metrics(score(test_features, artifact), artifact)
+
+    for col in ['test_end', 'test_start', 'train_start', 'fold']:
+        metrics.insert(0, col, fold[col])
+    metrics['train_users'] = len(train_features)
+    metrics['test_users'] = len(test_features)
+    metrics['runtime_s'] = time.perf_counter() - start
+    return metrics
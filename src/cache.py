@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from src.ingest import iter_logs
+from src.feature_engineer import FEATURE_VERSION, extract_features
+
+CACHE_DIR = 'cache'
+
+# Total size the cache may grow to before old partitions are evicted
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+MANIFEST = 'manifest.json'
+
+def file_digest(file_path, block_size=1 << 20):
+    """SHA-256 of the file contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_logs_cached(file_path, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, digest=None):
+    """
+    Load the event frame for `file_path` from the day-partitioned Feather
+    cache, parsing the CSV and filling the cache on a miss
+    """
+    partitions = day_partitions(file_path, cache_dir, max_bytes, digest)
+    return _read_tables([path for paths in partitions.values() for path in paths])
+
+def day_partitions(file_path, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, digest=None):
+    """
+    Paths of the cached Feather partitions of `file_path` per day
+    ('YYYY-MM-DD'), in day order, parsing the CSV on a miss
+    """
+    digest = digest or file_digest(file_path)
+    entry_dir = os.path.join(cache_dir, digest, 'events')
+    manifest_path = os.path.join(entry_dir, MANIFEST)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            partitions = json.load(f)['partitions']
+        if all(os.path.exists(os.path.join(entry_dir, p)) for p in partitions):
+            return _by_day(entry_dir, partitions)
+
+    # Miss or partially evicted entry: parse the source again
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    partitions = []
+    for i, chunk in enumerate(iter_logs(file_path)):
+        days = chunk['timestamp'].dt.strftime('%Y-%m-%d')
+        for day, part in chunk.groupby(days, sort=True):
+            name = os.path.join(f'day={day}', f'part-{i:05d}.feather')
+            _write_table(part.reset_index(drop=True), os.path.join(entry_dir, name))
+            partitions.append(name)
+    # Keep the cached frame in day order
+    partitions.sort()
+    with open(manifest_path, 'w') as f:
+        json.dump({'source': os.path.abspath(file_path), 'partitions': partitions}, f)
+
+    evict(cache_dir, max_bytes)
+    return _by_day(entry_dir, partitions)
+
+def extract_features_cached(file_path, df=None, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                            digest=None):
+    """
+    Feature frame for `file_path`, keyed by the source content hash and
+    FEATURE_VERSION. `df` is used instead of loading the events on a miss.
+    """
+    digest = digest or file_digest(file_path)
+    path = os.path.join(cache_dir, digest, f'features-v{FEATURE_VERSION}.feather')
+    if os.path.exists(path):
+        return _read_tables([path])
+
+    if df is None:
+        df = load_logs_cached(file_path, cache_dir, max_bytes, digest)
+    features = extract_features(df)
+    _write_table(features, path)
+    evict(cache_dir, max_bytes)
+    return features
+
+def evict(cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    """Delete least recently used Feather partitions until the cache fits in `max_bytes`"""
+    files = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if name.endswith('.feather'):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+def _by_day(entry_dir, partitions):
+    days = {}
+    for name in partitions:
+        day = os.path.dirname(name)[len('day='):]
+        days.setdefault(day, []).append(os.path.join(entry_dir, name))
+    return days
+
+def _write_table(frame, path):
+    """Write a frame as uncompressed Feather so it can be memory-mapped back"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # Use one dictionary index width so partitions concatenate cleanly
+    fields = [
+        pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+        if pa.types.is_dictionary(field.type) else field
+        for field in table.schema
+    ]
+    table = table.cast(pa.schema(fields, metadata=table.schema.metadata))
+    feather.write_feather(table, path, compression='uncompressed')
+
+def _read_tables(paths):
+    """Memory-map Feather files and return them as one DataFrame"""
+    if not paths:
+        return pd.DataFrame()
+    tables = [feather.read_table(path, memory_map=True) for path in paths]
+    for path in paths:
+        # Reads refresh the mtime, which is what LRU eviction orders by
+        os.utime(path)
+    return pa.concat_tables(tables).to_pandas()
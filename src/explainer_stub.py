@@ -0,0 +1,57 @@
+"""
+Local stand-in for the explanation API so the pipeline and the batch
+explainer can run offline:
+
+    python -m src.explainer_stub --port 8765 --delay 0.5
+    DEEPSEEK_API_URL=http://127.0.0.1:8765/v1/generate python main.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a canned chat completion after `server.delay` seconds"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        time.sleep(self.server.delay)
+
+        prompt = payload.get('messages', [{}])[-1].get('content', '')
+        body = json.dumps({
+            'choices': [{'message': {'role': 'assistant', 'content': f"[stub] {prompt[:200]}"}}]
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on this request, e.g. after its deadline
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(host='127.0.0.1', port=0, delay=0.0):
+    """Start the stub in a background thread and return (server, url); stop it with server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1/generate"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local stub of the explanation API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before each response")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.delay = args.delay
+    print(f"Stub explanation API listening on http://{args.host}:{args.port}/v1/generate")
+    server.serve_forever()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+import numpy as np
+
+CACHE_PATH = 'cache/explanations.sqlite'
+
+# Scoring outputs change between runs without the behaviour changing, so
+# they are left out of the cache key
+IGNORED_FIELDS = {
+    'anomaly_prob', 'anomaly_score', 'anomaly_decision', 'anomaly_percentile',
+    'partition', 'is_anomalous', 'explanation'
+}
+
+def explanation_key(user_data, significant_digits=None):
+    """
+    Stable hash of the model-relevant fields of `user_data`. With
+    `significant_digits`, numbers are rounded first so small drifts in the
+    feature values map to the same key.
+    """
+    fields = {}
+    for name in sorted(user_data):
+        if name in IGNORED_FIELDS:
+            continue
+        value = user_data[name]
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+            if math.isnan(value):
+                value = None
+            elif significant_digits:
+                value = float(f"{value:.{significant_digits}g}")
+        fields[name] = value
+    encoded = json.dumps(fields, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+class ExplanationCache:
+    """
+    Two-tier explanation cache: an in-process LRU in front of a SQLite table.
+    Entries expire after `ttl` seconds and the table is trimmed to
+    `max_entries` by least recent access. Pass path=None for memory only.
+    """
+
+    def __init__(self, path=CACHE_PATH, memory_size=1024, max_entries=100_000,
+                 ttl=7 * 24 * 3600, significant_digits=3):
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.significant_digits = significant_digits
+        self.memory = OrderedDict()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+
+        self.db = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.db = sqlite3.connect(path)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS explanations ("
+                "key TEXT PRIMARY KEY, explanation TEXT, created_at REAL, accessed_at REAL)"
+            )
+            self.db.commit()
+
+    def key(self, user_data):
+        return explanation_key(user_data, self.significant_digits)
+
+    def get(self, user_data):
+        """Cached explanation for `user_data`, or None"""
+        key = self.key(user_data)
+        now = time.time()
+
+        entry = self.memory.get(key)
+        if entry is not None:
+            explanation, created_at = entry
+            if now - created_at <= self.ttl:
+                self.memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return explanation
+            del self.memory[key]
+
+        if self.db is not None:
+            row = self.db.execute(
+                "SELECT explanation, created_at FROM explanations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                self.db.execute("UPDATE explanations SET accessed_at = ? WHERE key = ?", (now, key))
+                self.db.commit()
+                self._remember(key, row[0], row[1])
+                self.counters['disk_hits'] += 1
+                return row[0]
+
+        self.counters['misses'] += 1
+        return None
+
+    def put(self, user_data, explanation):
+        """Store an explanation in both tiers"""
+        key = self.key(user_data)
+        now = time.time()
+        self._remember(key, explanation, now)
+        if self.db is not None:
+            self.db.execute(
+                "INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?)", (key, explanation, now, now)
+            )
+            self.db.commit()
+        self.counters['stores'] += 1
+
+    def evict(self):
+        """Drop expired entries and trim the disk tier to `max_entries`"""
+        if self.db is None:
+            return
+        self.db.execute("DELETE FROM explanations WHERE created_at < ?", (time.time() - self.ttl,))
+        self.db.execute(
+            "DELETE FROM explanations WHERE key IN ("
+            "SELECT key FROM explanations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self.db.commit()
+
+    def stats(self):
+        """Hit/miss counters plus the overall hit rate"""
+        stats = dict(self.counters)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _remember(self, key, explanation, created_at):
+        self.memory[key] = (explanation, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
@@ -1,32 +1,52 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from collections import Counter
 
-def extract_features(df):
-    # Convert the timestamp column to datetime if it isn't already
-    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Extract hour from timestamp
-    df['hour'] = df['timestamp'].dt.hour
+# Bump whenever the feature definitions change, so cached feature frames
+# built by older code are not reused
+FEATURE_VERSION = 1
+
+# Event types counted per user, mapped to their feature column
+EVENT_COUNT_COLUMNS = {
+    'login': 'login_count',
+    'file_access': 'file_access_count',
+    'email': 'email_count',
+    'usb_usage': 'usb_usage_count'
+}
+
+# Typical resource access patterns by department
+DEPT_TYPICAL_RESOURCES = {
+    'IT': ['server_logs', 'network_configs', 'system_backups'],
+    'HR': ['employee_records', 'hiring_docs', 'benefits_info'],
+    'Finance': ['invoices', 'budget_reports', 'expense_claims'],
+    'Marketing': ['campaign_assets', 'market_research', 'brand_guidelines'],
+    'Sales': ['customer_data', 'sales_reports', 'lead_lists'],
+    'Engineering': ['product_specs', 'code_repos', 'design_docs'],
+    'Executive': ['board_minutes', 'strategy_docs', 'performance_reviews']
+}
+
+# Additional suspicious resource patterns
+SENSITIVE_RESOURCES = [
+    'payroll_data', 'employee_reviews', 'salary_info', 'hr_database',
+    'executive_meeting_notes', 'strategic_plans', 'acquisition_plans',
+    'financial_reports'
+]
+
+# Default trailing windows for extract_windowed_features
+DEFAULT_WINDOWS = ['1h', '24h', '7d']
+
+# Off-hours window: OFFHOURS_START:00 until OFFHOURS_END:00 the next morning
+OFFHOURS_START = 22
+OFFHOURS_END = 4
+
+def extract_features(df, windows=None, now=None):
+    # Derived columns are computed alongside df rather than added to it
+    hour = event_hours(df)
     
     # Define off-hours (10 PM - 4 AM)
-    df['is_offhours'] = df['hour'].apply(lambda h: h >= 22 or h < 4)
+    offhours = is_offhours(hour)
     
     # Basic user activity aggregations
-    features = df.groupby(['user', 'department']).agg(
-        total_logs=('event_type', 'count'),
-        login_count=('event_type', lambda x: (x == 'login').sum()),
-        file_access_count=('event_type', lambda x: (x == 'file_access').sum()),
-        email_count=('event_type', lambda x: (x == 'email').sum()),
-        usb_usage_count=('event_type', lambda x: (x == 'usb_usage').sum()),
-        avg_file_size=('file_size', 'mean'),
-        max_file_size=('file_size', 'max'),
-        total_file_size=('file_size', lambda x: pd.to_numeric(x, errors='coerce').fillna(0).sum()),
-        offhours_access_count=('is_offhours', lambda x: x.sum()),
-        unique_resources=('resource', lambda x: len(set(x)))
-    ).reset_index()
+    features = aggregate_user_activity(df, offhours)
     
     # Calculate percentage of off-hours activity
     features['offhours_access_pct'] = features['offhours_access_count'] / features['total_logs'] * 100
@@ -38,76 +58,184 @@ def extract_features(df):
     # Add department-specific resource access features
     features = add_department_access_features(df, features)
     
+    # Add burst features over rolling time windows if requested
+    if windows:
+        features = features.merge(extract_windowed_features(df, windows, now), on='user', how='left')
+    
     # Add label if it exists in the dataframe
     if 'label' in df.columns:
-        label_map = df.groupby('user')['label'].first().to_dict()
+        label_map = df.groupby('user', observed=True)['label'].first().to_dict()
         features['label'] = features['user'].map(label_map)
     
     return features
 
-def add_department_access_features(df, features_df):
-    """Calculate features related to accessing resources from other departments"""
-    # Identify typical resource access patterns by department
-    dept_typical_resources = {
-        'IT': ['server_logs', 'network_configs', 'system_backups'],
-        'HR': ['employee_records', 'hiring_docs', 'benefits_info'],
-        'Finance': ['invoices', 'budget_reports', 'expense_claims'],
-        'Marketing': ['campaign_assets', 'market_research', 'brand_guidelines'],
-        'Sales': ['customer_data', 'sales_reports', 'lead_lists'],
-        'Engineering': ['product_specs', 'code_repos', 'design_docs'],
-        'Executive': ['board_minutes', 'strategy_docs', 'performance_reviews']
-    }
-    
-    # Additional suspicious resource patterns
-    sensitive_resources = [
-        'payroll_data', 'employee_reviews', 'salary_info', 'hr_database',
-        'executive_meeting_notes', 'strategic_plans', 'acquisition_plans',
-        'financial_reports'
-    ]
-    
-    # Calculate cross-department access for each user
-    users_depts = features_df.set_index('user')['department'].to_dict()
-    
-    # Initialize new features
-    features_df['cross_dept_access_count'] = 0
-    features_df['sensitive_resource_access'] = 0
-    
-    # Loop through each user
-    for user, group in df.groupby('user'):
-        if user not in users_depts:
-            continue
-            
-        dept = users_depts[user]
-        
-        # Count resources accessed from other departments
-        cross_dept_count = 0
-        sensitive_access = 0
-        
-        # Create a counter of resources accessed by this user
-        resource_counts = Counter(group['resource'].dropna())
+def extract_windowed_features(df, windows=DEFAULT_WINDOWS, now=None):
+    """
+    Per-user burst features over trailing time windows (e.g. '1h', '24h', '7d').
+    Event counts, file size sums and off-hours shares are computed at every
+    event with a grouped time-based rolling sum over the sorted timestamps.
+    For each window this returns the per-user maximum (<metric>_<window>_max)
+    and the value for the window ending at `now`, by default the latest
+    timestamp in `df` (<metric>_<window>_latest).
+    """
+    timestamps = df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+    if now is None:
+        now = timestamps.max()
+    
+    events = decategorize(pd.DataFrame({
+        'user': df['user'],
+        'timestamp': timestamps,
+        'events': 1.0,
+        'file_size': pd.to_numeric(df['file_size'], errors='coerce').astype('float64').fillna(0),
+        'offhours': is_offhours(timestamps.dt.hour).astype('float64')
+    }), ['user']).sort_values(['user', 'timestamp'], kind='stable')
+    sums = ['events', 'file_size', 'offhours']
+    
+    windowed = pd.DataFrame(index=pd.Index(events['user'].unique(), name='user'))
+    for window in windows:
+        # Trailing-window totals ending at each event, per user
+        rolled = events.groupby('user', sort=False)[['timestamp'] + sums].rolling(window, on='timestamp').sum()
+        rolled = rolled.droplevel(-1)
+        maxima = rolled[['events', 'file_size']].groupby(level='user').max()
+        offhours_pct = (rolled['offhours'] / rolled['events'] * 100).groupby(level='user').max()
         
-        # Count the cross-department accesses
-        for resource, count in resource_counts.items():
-            resource_found = False
-            
-            # Check if this resource belongs to user's department
-            if dept in dept_typical_resources:
-                if resource in dept_typical_resources[dept]:
-                    resource_found = True
-            
-            # If resource doesn't belong to user's dept, increment counter
-            if not resource_found and resource:
-                cross_dept_count += count
-            
-            # Check for sensitive resource access
-            if resource in sensitive_resources:
-                sensitive_access += count
+        # Totals of the window ending at `now`
+        recent = events[events['timestamp'] > now - pd.Timedelta(window)]
+        latest = recent.groupby('user')[sums].sum().reindex(windowed.index, fill_value=0)
         
-        # Update the features dataframe
-        idx = features_df[features_df['user'] == user].index
-        if len(idx) > 0:
-            features_df.loc[idx, 'cross_dept_access_count'] = cross_dept_count
-            features_df.loc[idx, 'sensitive_resource_access'] = sensitive_access
+        windowed[f'events_{window}_max'] = maxima['events']
+        windowed[f'file_size_{window}_max'] = maxima['file_size']
+        windowed[f'offhours_pct_{window}_max'] = offhours_pct
+        windowed[f'events_{window}_latest'] = latest['events']
+        windowed[f'file_size_{window}_latest'] = latest['file_size']
+        windowed[f'offhours_pct_{window}_latest'] = (latest['offhours'] / latest['events'] * 100).fillna(0)
+    
+    return windowed.reset_index()
+
+def event_hours(df):
+    """Hour of day of every event as int8, parsing string timestamps if needed"""
+    timestamps = df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+    return timestamps.dt.hour.astype('int8')
+
+def is_offhours(hour):
+    """Vectorized off-hours flag for a Series of hours"""
+    return (hour >= OFFHOURS_START) | (hour < OFFHOURS_END)
+
+def aggregate_user_activity(df, offhours=None):
+    """
+    Per-(user, department) activity aggregates using only built-in grouped
+    reductions, so no Python code runs per group. `offhours` is the per-event
+    off-hours flag, derived from the timestamps when not given.
+    """
+    keys = ['user', 'department']
+    if offhours is None:
+        offhours = is_offhours(event_hours(df))
+    grouped = activity_columns(df, offhours).groupby(keys, observed=True, sort=False)
+    features = grouped.agg(
+        total_logs=('event_type', 'count'),
+        **{col: (col, 'sum') for col in EVENT_COUNT_COLUMNS.values()},
+        avg_file_size=('file_size', 'mean'),
+        max_file_size=('file_size', 'max'),
+        total_file_size=('file_size', 'sum'),
+        offhours_access_count=('offhours_access_count', 'sum')
+    )
+    # Missing resources count as one distinct value, like set() did
+    features['unique_resources'] = grouped['resource'].nunique(dropna=False)
+    features = features.reset_index()
+    
+    # Report keys with their plain string values, sorted like a regular groupby
+    return decategorize(features, keys).sort_values(keys, ignore_index=True)
+
+def activity_columns(df, offhours):
+    """
+    Per-event inputs to the activity aggregates: group keys, one boolean
+    column per counted event type, numeric file size and the off-hours flag
+    """
+    event_type = df['event_type']
+    
+    columns = {key: df[key] for key in ['user', 'department']}
+    columns['event_type'] = event_type
+    for event, col in EVENT_COUNT_COLUMNS.items():
+        columns[col] = event_type == event
+    columns['file_size'] = pd.to_numeric(df['file_size'], errors='coerce').astype('float64')
+    columns['offhours_access_count'] = offhours.astype(bool)
+    columns['resource'] = df['resource']
+    return pd.DataFrame(columns, copy=False)
+
+def decategorize(frame, columns):
+    """Convert categorical columns back to their plain category values"""
+    for col in columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(frame[col].cat.categories.dtype)
+    return frame
+
+def build_resource_access_table(dept_typical_resources=None, sensitive_resources=None):
+    """
+    Lookup table with one row per (department, resource) pair and boolean
+    is_typical / is_sensitive flags. Pairs missing from the table are neither.
+    """
+    if dept_typical_resources is None:
+        dept_typical_resources = DEPT_TYPICAL_RESOURCES
+    if sensitive_resources is None:
+        sensitive_resources = SENSITIVE_RESOURCES
+    
+    resources = list(dict.fromkeys(
+        [r for typical in dept_typical_resources.values() for r in typical] + list(sensitive_resources)
+    ))
+    table = pd.MultiIndex.from_product(
+        [list(dept_typical_resources), resources], names=['department', 'resource']
+    ).to_frame(index=False)
+    
+    typical_pairs = pd.MultiIndex.from_tuples(
+        [(dept, r) for dept, typical in dept_typical_resources.items() for r in typical]
+    )
+    table['is_typical'] = pd.MultiIndex.from_frame(table[['department', 'resource']]).isin(typical_pairs)
+    table['is_sensitive'] = table['resource'].isin(sensitive_resources)
+    return table
+
+def department_access_counts(events, access_table=None):
+    """
+    Per-(user, department) cross-department and sensitive access counts. `events` needs
+    user, department and resource columns; the department is the one the
+    access is judged against.
+    """
+    if access_table is None:
+        access_table = build_resource_access_table()
+    
+    # Collapse to one row per (user, department, resource) before the join
+    accessed = events[events['resource'].notna() & (events['resource'] != '')]
+    counts = accessed.groupby(['user', 'department', 'resource'], observed=True).size()
+    counts = decategorize(counts.rename('count').reset_index(), ['user', 'department', 'resource'])
+    
+    counts = counts.merge(
+        access_table[['department', 'resource', 'is_typical', 'is_sensitive']],
+        on=['department', 'resource'], how='left'
+    )
+    is_typical = counts['is_typical'].fillna(False).astype(bool)
+    is_sensitive = counts['is_sensitive'].fillna(False).astype(bool)
+    counts['cross_dept_access_count'] = counts['count'].where(~is_typical, 0)
+    counts['sensitive_resource_access'] = counts['count'].where(is_sensitive, 0)
+    
+    access_cols = ['cross_dept_access_count', 'sensitive_resource_access']
+    return counts.groupby(['user', 'department'])[access_cols].sum()
+
+def add_department_access_features(df, features_df, access_table=None):
+    """Calculate features related to accessing resources from other departments"""
+    # Judge every access against the user's department in the feature table
+    users_depts = features_df.drop_duplicates('user', keep='last').set_index('user')['department']
+    events = pd.DataFrame({
+        'user': df['user'],
+        'department': df['user'].map(users_depts),
+        'resource': df['resource']
+    })
+    counts = department_access_counts(events, access_table).groupby(level='user').sum()
+    
+    for col in ['cross_dept_access_count', 'sensitive_resource_access']:
+        features_df[col] = features_df['user'].map(counts[col]).fillna(0).astype('int64')
     
     # Calculate percentage of cross-department access
     features_df['cross_dept_access_pct'] = (features_df['cross_dept_access_count'] / 
@@ -0,0 +1,160 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from src.feature_engineer import (
+    EVENT_COUNT_COLUMNS, activity_columns, build_resource_access_table,
+    decategorize, department_access_counts, is_offhours
+)
+
+KEYS = ['user', 'department']
+
+# Accumulators merged by addition and by maximum respectively
+SUM_COLUMNS = (['total_logs'] + list(EVENT_COUNT_COLUMNS.values()) +
+               ['file_size_count', 'total_file_size', 'offhours_access_count',
+                'cross_dept_access_count', 'sensitive_resource_access'])
+MAX_COLUMNS = ['max_file_size']
+
+# Placeholder for a missing resource in the per-user resource sets
+MISSING_RESOURCE = None
+
+class FeatureState:
+    """
+    Persistent per-(user, department) feature accumulators. Each batch of new
+    events only touches the users that appear in it, and the feature frame
+    produced by extract_features is derived from the accumulated state.
+    """
+
+    def __init__(self, access_table=None):
+        if access_table is None:
+            access_table = build_resource_access_table()
+        self.access_table = access_table
+        self.accumulators = pd.DataFrame(
+            columns=SUM_COLUMNS + MAX_COLUMNS,
+            index=pd.MultiIndex.from_tuples([], names=KEYS)
+        ).astype({**{col: 'int64' for col in SUM_COLUMNS},
+                  'total_file_size': 'float64', 'max_file_size': 'float64'})
+        self.resources = {}
+        self.labels = {}
+
+    def update(self, events):
+        """Fold a batch of events into the state and return the touched users' features"""
+        batch = batch_accumulators(events, self.access_table)
+        self._merge_accumulators(batch)
+
+        # Unique resources are kept as exact per-user sets, which merge by union
+        pairs = decategorize(events[KEYS + ['resource']].drop_duplicates(), KEYS + ['resource'])
+        for user, dept, resource in pairs.itertuples(index=False):
+            resource = MISSING_RESOURCE if pd.isna(resource) else resource
+            self.resources.setdefault((user, dept), set()).add(resource)
+
+        if 'label' in events.columns:
+            first_labels = events.groupby('user', observed=True, sort=False)['label'].first()
+            for user, label in first_labels.items():
+                self.labels.setdefault(user, label)
+
+        return self.features(batch.index)
+
+    def merge(self, other):
+        """Merge another state built from a disjoint set of events into this one"""
+        self._merge_accumulators(other.accumulators)
+        for key, resources in other.resources.items():
+            self.resources.setdefault(key, set()).update(resources)
+        for user, label in other.labels.items():
+            self.labels.setdefault(user, label)
+        return self
+
+    def _merge_accumulators(self, batch):
+        known = batch.index.isin(self.accumulators.index)
+
+        existing = batch[known]
+        if len(existing):
+            current = self.accumulators.loc[existing.index]
+            merged = current[SUM_COLUMNS] + existing[SUM_COLUMNS]
+            for col in MAX_COLUMNS:
+                merged[col] = np.fmax(current[col], existing[col])
+            self.accumulators.loc[existing.index, merged.columns] = merged
+
+        new = batch[~known]
+        if len(new):
+            if len(self.accumulators):
+                self.accumulators = pd.concat([self.accumulators, new])
+            else:
+                self.accumulators = new.copy()
+
+    def features(self, keys=None):
+        """Feature frame for all users, or for the given (user, department) keys"""
+        acc = self.accumulators if keys is None else self.accumulators.loc[keys]
+        features = acc.reset_index()
+
+        features['avg_file_size'] = (features['total_file_size'] / features['file_size_count']).fillna(0)
+        features['max_file_size'] = features['max_file_size'].fillna(0)
+        features['unique_resources'] = [
+            len(self.resources.get(key, ())) for key in zip(features['user'], features['department'])
+        ]
+        features['offhours_access_pct'] = features['offhours_access_count'] / features['total_logs'] * 100
+        features['cross_dept_access_pct'] = (features['cross_dept_access_count'] /
+                                             features['file_access_count'] * 100).fillna(0)
+        features['sensitive_resource_pct'] = (features['sensitive_resource_access'] /
+                                              features['file_access_count'] * 100).fillna(0)
+
+        columns = (KEYS + ['total_logs'] + list(EVENT_COUNT_COLUMNS.values()) +
+                   ['avg_file_size', 'max_file_size', 'total_file_size', 'offhours_access_count',
+                    'unique_resources', 'offhours_access_pct', 'cross_dept_access_count',
+                    'sensitive_resource_access', 'cross_dept_access_pct', 'sensitive_resource_pct'])
+        features = features.reindex(columns=columns)
+        if self.labels:
+            features['label'] = features['user'].map(self.labels)
+        if keys is None:
+            features = features.sort_values(KEYS, ignore_index=True)
+        return features
+
+    def save(self, path):
+        """Persist the state with pickle"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        """Load a state written by save()"""
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+def batch_accumulators(events, access_table=None):
+    """Mergeable per-(user, department) accumulators for one batch of events"""
+    timestamps = events['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+
+    columns = activity_columns(events, is_offhours(timestamps.dt.hour))
+    grouped = columns.groupby(KEYS, observed=True, sort=False)
+    batch = grouped.agg(
+        total_logs=('event_type', 'count'),
+        **{col: (col, 'sum') for col in EVENT_COUNT_COLUMNS.values()},
+        file_size_count=('file_size', 'count'),
+        total_file_size=('file_size', 'sum'),
+        offhours_access_count=('offhours_access_count', 'sum'),
+        max_file_size=('file_size', 'max')
+    )
+    batch = decategorize(batch.reset_index(), KEYS).set_index(KEYS)
+
+    # Each access is judged against the department recorded on the event
+    access = department_access_counts(events[KEYS + ['resource']], access_table)
+    batch = batch.join(access, how='left')
+    for col in access.columns:
+        batch[col] = batch[col].fillna(0).astype('int64')
+    return batch[SUM_COLUMNS + MAX_COLUMNS]
+
+def append_events(state_path, events, access_table=None):
+    """
+    Apply a batch of new events to the state stored at `state_path`, creating
+    it if needed, and return the updated feature rows of the touched users
+    """
+    if os.path.exists(state_path):
+        state = FeatureState.load(state_path)
+    else:
+        state = FeatureState(access_table)
+    features = state.update(events)
+    state.save(state_path)
+    return features
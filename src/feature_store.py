@@ -0,0 +1,58 @@
+"""
+On-disk float32 feature matrices shared by worker processes. A matrix is
+written once as a .npy file with a JSON sidecar holding its column
+metadata; workers memory-map it and slice their rows, so nothing is
+pickled per worker and the operating system shares the pages between them.
+"""
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Rows converted per block while writing a matrix
+WRITE_CHUNK_ROWS = 50_000
+
+def write_matrix(features_df, columns, path, scaler=None, chunk_rows=WRITE_CHUNK_ROWS):
+    """
+    Write the `columns` of a feature frame to `path` as a float32 .npy
+    matrix, standardized with `scaler` when given. Rows are converted in
+    blocks of `chunk_rows`, so no full float64 copy of the matrix exists at
+    any point. Returns `path`.
+    """
+    columns = list(columns)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                       shape=(len(features_df), len(columns)))
+    for start in range(0, len(features_df), chunk_rows):
+        block = features_df.iloc[start:start + chunk_rows][columns]
+        if scaler is not None:
+            matrix[start:start + len(block)] = scaler.transform(block)
+        else:
+            matrix[start:start + len(block)] = block.to_numpy(dtype=np.float32)
+    matrix.flush()
+    del matrix
+
+    metadata = {
+        'columns': columns,
+        'rows': len(features_df),
+        'dtype': 'float32',
+        'scaled': scaler is not None,
+        'created_at': datetime.now().isoformat()
+    }
+    with open(_metadata_path(path), 'w') as f:
+        json.dump(metadata, f)
+    return path
+
+def open_matrix(path):
+    """Attach to a matrix written by write_matrix: a read-only memmap and its metadata"""
+    with open(_metadata_path(path)) as f:
+        metadata = json.load(f)
+    return np.load(path, mmap_mode='r'), metadata
+
+def matrix_frame(matrix, columns, start=0, stop=None):
+    """Rows start:stop of an attached matrix as a DataFrame over the same memory"""
+    return pd.DataFrame(matrix[start:stop], columns=columns, copy=False)
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
@@ -1,5 +1,292 @@
+import bz2
+import glob
+import gzip
+import lzma
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Declared column types for the event log. Blank fields become missing values
+# instead of forcing the whole column to object dtype. File sizes are stored
+# as nullable int32, which covers single transfers of up to 2 GiB.
+EVENT_DTYPES = {
+    'user': 'category',
+    'department': 'category',
+    'event_type': 'category',
+    'resource': 'category',
+    'label': 'category',
+    'file_size': 'Int32',
+}
+
+# Timestamps are written with datetime.isoformat(), so parse them as ISO 8601
+# instead of letting pandas infer the format
+TIMESTAMP_FORMAT = 'ISO8601'
+
+# Default number of rows per chunk in streaming mode
+DEFAULT_CHUNKSIZE = 1_000_000
+
+# Columns every source file is normalized to
+EVENT_COLUMNS = ['user', 'department', 'timestamp', 'event_type', 'file_size', 'resource']
+
+# Alternative column names used by other collectors
+COLUMN_ALIASES = {
+    'username': 'user',
+    'dept': 'department',
+    'time': 'timestamp',
+    '@timestamp': 'timestamp',
+    'event': 'event_type',
+    'size': 'file_size',
+    'bytes': 'file_size',
+    'path': 'resource',
+}
+
+# Decompressors by file extension. zstd goes through pyarrow, which bundles
+# the codec, so no extra package is needed.
+COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd', '.zstd': 'zstd'}
+
+# Parsers by file extension once any compression extension is removed
+SOURCE_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl'}
 
 def load_logs(file_path):
-    df = pd.read_csv(file_path, parse_dates=['timestamp'])
-    return df
\ No newline at end of file
+    df = pd.read_csv(file_path, dtype=EVENT_DTYPES)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format=TIMESTAMP_FORMAT)
+    return df
+
+def iter_logs(file_path, chunksize=DEFAULT_CHUNKSIZE, engine='c'):
+    """
+    Stream the log file as typed DataFrame chunks of at most `chunksize` rows.
+    Peak memory depends on the chunk size rather than on the file size.
+    Set engine='pyarrow' to parse with the pyarrow CSV reader.
+    """
+    if engine == 'pyarrow':
+        yield from _iter_logs_pyarrow(file_path, chunksize)
+        return
+
+    with pd.read_csv(file_path, dtype=EVENT_DTYPES, chunksize=chunksize) as reader:
+        for chunk in reader:
+            chunk['timestamp'] = pd.to_datetime(chunk['timestamp'], format=TIMESTAMP_FORMAT)
+            yield chunk
+
+def _iter_logs_pyarrow(file_path, chunksize):
+    """Streaming reader built on pyarrow.csv.open_csv, re-batched to `chunksize` rows"""
+    import pyarrow as pa
+    from pyarrow import csv
+
+    column_types = {
+        col: pa.dictionary(pa.int32(), pa.string())
+        for col, dtype in EVENT_DTYPES.items() if dtype == 'category'
+    }
+    column_types['file_size'] = pa.int32()
+    column_types['timestamp'] = pa.timestamp('us')
+
+    convert_options = csv.ConvertOptions(
+        column_types=column_types,
+        timestamp_parsers=[csv.ISO8601],
+        strings_can_be_null=True
+    )
+    types_mapper = {pa.int32(): pd.Int32Dtype()}.get
+
+    pending = []
+    pending_rows = 0
+    with csv.open_csv(file_path, convert_options=convert_options) as reader:
+        for batch in reader:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunksize:
+                table = pa.Table.from_batches(pending)
+                yield table.slice(0, chunksize).to_pandas(types_mapper=types_mapper)
+                rest = table.slice(chunksize)
+                pending = rest.to_batches()
+                pending_rows = rest.num_rows
+
+    if pending_rows:
+        yield pa.Table.from_batches(pending).to_pandas(types_mapper=types_mapper)
+
+def compact_events(df):
+    """
+    Event frame in the compact schema of EVENT_DTYPES: categorical string
+    columns, nullable int32 file sizes and datetime timestamps. Columns that
+    already have the target dtype are reused as they are.
+    """
+    columns = {}
+    for col in df.columns:
+        dtype = EVENT_DTYPES.get(col)
+        if col == 'timestamp' and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            columns[col] = pd.to_datetime(df[col], format=TIMESTAMP_FORMAT)
+        elif col == 'file_size' and df[col].dtype != dtype:
+            # Blank strings from the CSV writer are missing sizes
+            columns[col] = pd.to_numeric(df[col].mask(df[col] == ''), errors='coerce').astype(dtype)
+        elif dtype == 'category' and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            columns[col] = df[col].mask(df[col] == '').astype('category')
+        else:
+            columns[col] = df[col]
+    return pd.DataFrame(columns, copy=False)
+
+def concat_events(frames):
+    """
+    Concatenate event frames and keep categorical columns categorical. Plain
+    pd.concat falls back to object dtype when the chunks' categories differ,
+    so their dictionaries are merged with union_categoricals first.
+    """
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = {}
+    for col in frames[0].columns:
+        parts = [frame[col] for frame in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[col] = pd.Series(union_categoricals(parts), name=col)
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns, copy=False)
+
+def source_paths(source):
+    """
+    Log files named by `source`: a file, a directory (searched recursively
+    for CSV and JSONL files, compressed or not), a glob pattern, or a list
+    of any of these. Paths are returned sorted, so hourly files named by
+    time come out in time order.
+    """
+    if isinstance(source, (list, tuple)):
+        return [path for item in source for path in source_paths(item)]
+    if os.path.isdir(source):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names]
+        paths = [path for path in paths if _source_format(path, strict=False)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    if not paths:
+        raise FileNotFoundError(f"No log files match {source}")
+    return sorted(paths)
+
+def read_source(path, columns=EVENT_COLUMNS):
+    """
+    Decompress and parse one CSV or JSONL log file (optionally gzip, bz2,
+    xz or zstd compressed) and normalize it to `columns`
+    """
+    compression, fmt = _source_format(path)
+    with _open_source(path, compression) as f:
+        if fmt == 'csv':
+            df = pd.read_csv(f, dtype=EVENT_DTYPES)
+        else:
+            df = pd.read_json(f, lines=True, dtype=False, convert_dates=False)
+    return normalize_events(df, columns)
+
+def normalize_events(df, columns=EVENT_COLUMNS):
+    """
+    Event frame with exactly `columns` in the compact EVENT_DTYPES schema.
+    Column names are matched case-insensitively and through COLUMN_ALIASES;
+    columns a source lacks are filled with missing values and extra ones are
+    dropped. Timestamps with UTC offsets are converted to naive UTC.
+    """
+    names = {col: str(col).strip().lower() for col in df.columns}
+    df = df.rename(columns=names)
+    aliases = {col: target for col, target in COLUMN_ALIASES.items()
+               if col in df.columns and target not in df.columns}
+    df = df.rename(columns=aliases).reindex(columns=columns)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = _parse_timestamps(df['timestamp'])
+    df = compact_events(df)
+
+    # Empty or missing columns get object or float categories; give every
+    # file the string categories the parsers produce so union_categoricals
+    # can merge them
+    string_dtype = pd.Index([], dtype=str).dtype
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            categories = df[col].cat.categories
+            if categories.dtype != string_dtype:
+                df[col] = df[col].cat.rename_categories(categories.astype(string_dtype))
+    return df
+
+def iter_sources(source, columns=EVENT_COLUMNS, max_workers=None, ordered=True):
+    """
+    Parse every file of `source` (see source_paths) in a process pool and
+    yield one normalized DataFrame per file. Decompression and parsing run
+    in the workers. With ordered=False, files are yielded as soon as they
+    finish, so one slow file doesn't hold back the rest. At most two files
+    per worker are in flight, so memory stays bounded however many files
+    match.
+    """
+    paths = source_paths(source)
+    max_workers = max_workers or os.cpu_count()
+    queued = iter(paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        def submit():
+            path = next(queued, None)
+            if path is not None:
+                return pool.submit(read_source, path, columns)
+
+        pending = deque(future for future in (submit() for _ in range(2 * max_workers)) if future)
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                pending = deque(future for future in pending if future not in finished)
+            for future in done:
+                chunk = future.result()
+                future = submit()
+                if future is not None:
+                    pending.append(future)
+                yield chunk
+
+def load_sources(source, columns=EVENT_COLUMNS, max_workers=None):
+    """All files of `source` parsed in parallel and concatenated in path order"""
+    return concat_events(iter_sources(source, columns, max_workers))
+
+def memory_usage_report(df):
+    """Per-column dtype and deep memory usage, largest first, with a total row"""
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'bytes': usage,
+        'mb': usage / (1024 * 1024),
+        'bytes_per_row': usage / max(len(df), 1)
+    }).sort_values('bytes', ascending=False)
+    report.loc['total'] = ['', usage.sum(), usage.sum() / (1024 * 1024), usage.sum() / max(len(df), 1)]
+    report['pct'] = report['bytes'] / usage.sum() * 100
+    return report
+
+def _source_format(path, strict=True):
+    """(compression, format) of a log file from its extensions"""
+    base, ext = os.path.splitext(path.lower())
+    compression = COMPRESSIONS.get(ext)
+    if compression is not None:
+        base, ext = os.path.splitext(base)
+    fmt = SOURCE_FORMATS.get(ext)
+    if fmt is None:
+        if strict:
+            raise ValueError(f"Unsupported log file {path}: expected .csv or .jsonl, optionally compressed")
+        return None
+    return compression, fmt
+
+def _open_source(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(path, 'rb')
+    if compression == 'xz':
+        return lzma.open(path, 'rb')
+    if compression == 'zstd':
+        import pyarrow as pa
+        return pa.input_stream(path, compression='zstd')
+    return open(path, 'rb')
+
+def _parse_timestamps(values):
+    """ISO 8601 timestamps as naive datetimes; values carrying UTC offsets become naive UTC"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = values
+    else:
+        values = values.mask(values == '')
+        try:
+            parsed = pd.to_datetime(values, format=TIMESTAMP_FORMAT)
+        except ValueError:
+            # Mixed offsets can only be parsed onto one timezone
+            parsed = pd.to_datetime(values, format=TIMESTAMP_FORMAT, utc=True)
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_convert(None)
+    return parsed
@@ -0,0 +1,110 @@
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_PATH = 'outputs/metrics.json'
+PROFILE_MODES = ['cprofile', 'tracemalloc']
+
+def current_rss_mb():
+    """Current resident set size in MB (falls back to the peak where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class StageRecorder:
+    """
+    Records wall time, CPU time, rows in/out and memory for each pipeline
+    stage. The stage named `profile_stage` also runs under cProfile or
+    tracemalloc and its profile is written to `profile_dir`.
+    """
+
+    def __init__(self, profile_stage=None, profile_mode='cprofile', profile_dir='outputs'):
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {profile_mode!r}, expected one of {PROFILE_MODES}")
+        self.profile_stage = profile_stage
+        self.profile_mode = profile_mode
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Time the enclosed block as stage `name`. The yielded dict can be
+        updated, e.g. record['rows_out'] = len(result).
+        """
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        profiler = self._start_profile() if name == self.profile_stage else None
+
+        rss_before = current_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+            record['rss_mb'] = current_rss_mb()
+            record['memory_delta_mb'] = record['rss_mb'] - rss_before
+            record['peak_rss_mb'] = peak_rss_mb()
+            if profiler is not None:
+                record['profile'] = self._stop_profile(name, profiler)
+            self.stages.append(record)
+
+    def summary(self):
+        return {
+            'started_at': self.started_at.isoformat(),
+            'total_wall_s': sum(s['wall_s'] for s in self.stages),
+            'total_cpu_s': sum(s['cpu_s'] for s in self.stages),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages
+        }
+
+    def write(self, path=METRICS_PATH):
+        """Write the stage metrics as JSON"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    def _start_profile(self):
+        if self.profile_mode == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+
+        import tracemalloc
+        tracemalloc.start()
+        return tracemalloc
+
+    def _stop_profile(self, name, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profile_mode == 'cprofile':
+            profiler.disable()
+            path = os.path.join(self.profile_dir, f'profile_{name}.prof')
+            profiler.dump_stats(path)
+            return path
+
+        snapshot = profiler.take_snapshot()
+        current, peak = profiler.get_traced_memory()
+        profiler.stop()
+        path = os.path.join(self.profile_dir, f'tracemalloc_{name}.txt')
+        with open(path, 'w') as f:
+            f.write(f"current: {current / (1024 * 1024):.1f} MB, peak: {peak / (1024 * 1024):.1f} MB\n")
+            for stat in snapshot.statistics('lineno')[:25]:
+                f.write(f"{stat}\n")
+        return path
@@ -1,133 +1,426 @@
 from sklearn.ensemble import IsolationForest, RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import joblib
 import pandas as pd
 import numpy as np
 import os
+import tempfile
+from src.feature_store import matrix_frame, open_matrix, write_matrix
 
-def detect_anomalies(features_df):
+# Default location of the trained model artifact
+MODEL_PATH = 'models/insider_threat_model.joblib'
+
+# Bump when the artifact layout changes so stale artifacts are rejected
+MODEL_ARTIFACT_VERSION = 1
+
+# Columns that are never used as model inputs
+NON_FEATURE_COLUMNS = ['user', 'department', 'label', 'is_anomalous', 'anomaly_prob', 'anomaly_score',
+                       'anomaly_decision', 'anomaly_percentile', 'partition', 'peer_anomaly_score']
+
+# Partition name shared by peer groups too small to get their own model
+POOLED_PARTITION = '_pooled'
+
+# Larger populations fit the unsupervised model on a reservoir sample of this many rows
+FIT_SAMPLE_SIZE = 100_000
+
+# Rows per task when scoring across a worker pool
+SCORE_CHUNK_ROWS = 50_000
+
+def detect_anomalies(features_df, model_path=None, partition_by=None, return_details=False):
     """
     Detect anomalies using both supervised and unsupervised methods
-    depending on whether labeled data is available
+    depending on whether labeled data is available.
+    If `model_path` points to a trained artifact, only score with it.
+    If `partition_by` is set, train one model per peer group instead.
+    With `return_details`, also return a dict with the feature_importances
+    and threat_analysis tables (None when the model has none), so callers
+    don't have to read them back from the CSV files.
     """
+    details = {'feature_importances': None, 'threat_analysis': None}
+    if model_path is not None and os.path.exists(model_path):
+        print(f"Scoring with trained model {model_path}")
+        artifact = load_model(model_path)
+        results = score(features_df, artifact)
+        details = {'feature_importances': artifact['feature_importances'],
+                   'threat_analysis': predict_threats(results, artifact)}
+    elif partition_by is not None:
+        results = detect_partitioned(features_df, partition_by)
     # Check if we have labeled data for supervised learning
-    if 'label' in features_df.columns:
-        return detect_supervised(features_df)
+    elif 'label' in features_df.columns:
+        results, details = detect_supervised(features_df, return_details=True)
     else:
-        return detect_unsupervised(features_df)
+        results = detect_unsupervised(features_df)
 
-def detect_unsupervised(features_df):
-    """Detect anomalies using unsupervised learning (Isolation Forest)"""
-    print("Using unsupervised anomaly detection (Isolation Forest)")
-    X = features_df.drop(columns=['user', 'department'])
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    if return_details:
+        return results, details
+    return results
 
-    model = IsolationForest(contamination=0.1, random_state=42)
-    features_df['anomaly_score'] = model.fit_predict(X_scaled)  # -1 = anomaly
-    return features_df
+def detect_unsupervised(features_df, sample_size=FIT_SAMPLE_SIZE, chunk_rows=SCORE_CHUNK_ROWS, max_workers=None):
+    """
+    Detect anomalies using unsupervised learning (Isolation Forest).
+    Populations larger than `sample_size` fit on a reservoir sample, and
+    populations larger than `chunk_rows` are scored in chunks across a
+    process pool.
+    """
+    print("Using unsupervised anomaly detection (Isolation Forest)")
+    artifact = train_unsupervised(features_df, sample_size=sample_size)
+    if len(features_df) > chunk_rows:
+        return score_chunked(features_df, artifact, chunk_rows, max_workers)
+    return score(features_df, artifact)
 
-def detect_supervised(features_df):
+def detect_supervised(features_df, return_details=False):
     """
     Detect anomalies using supervised learning (Random Forest Classifier)
     Train on existing labeled data to identify known threat patterns
     """
     print("Using supervised anomaly detection (Random Forest Classifier)")
-    
+
     # Create binary target variable (normal vs anomalous)
-    features_df['is_anomalous'] = features_df['label'].apply(lambda x: 0 if x == 'normal' else 1)
-    
-    # Save the original labels for later
-    original_labels = features_df['label'].copy()
-    
-    # Feature columns (exclude user, department, label, and is_anomalous)
-    feature_cols = [col for col in features_df.columns 
-                   if col not in ['user', 'department', 'label', 'is_anomalous']]
-    
-    # Split into features and target
-    X = features_df[feature_cols]
-    y = features_df['is_anomalous']
-    
+    features_df['is_anomalous'] = (features_df['label'] != 'normal').astype(int)
+
+    artifact = train_supervised(features_df)
+
+    # Save feature importances
+    os.makedirs('outputs', exist_ok=True)
+    artifact['feature_importances'].to_csv('outputs/feature_importances.csv', index=False)
+    print(f"Feature importances saved to outputs/feature_importances.csv")
+
+    features_df = score(features_df, artifact)
+
+    # Additional analysis for different types of threats
+    threat_df = None
+    if artifact['threat_model'] is not None:
+        print("Training multi-class classifier for threat type identification")
+
+        # Save the mapping of encoded labels
+        le = artifact['label_encoder']
+        pd.DataFrame({
+            'encoded_value': list(range(len(le.classes_))),
+            'threat_type': list(le.classes_)
+        }).to_csv('outputs/threat_type_mapping.csv', index=False)
+
+        # Threat types are analysed for the users labelled as anomalous
+        threat_df = predict_threats(features_df, artifact, features_df['is_anomalous'] == 1)
+        threat_df.to_csv('outputs/threat_analysis.csv', index=False)
+        print(f"Threat type analysis saved to outputs/threat_analysis.csv")
+
+    if return_details:
+        return features_df, {'feature_importances': artifact['feature_importances'],
+                             'threat_analysis': threat_df}
+    return features_df
+
+def detect_partitioned(features_df, partition_by='department', max_workers=None, min_partition_size=20):
+    """
+    Train and score one model per peer group across a process pool.
+    `partition_by` is a column name or a Series of group names aligned with
+    the frame. Groups with fewer than `min_partition_size` users share one
+    pooled model. Scores are calibrated to a percentile within each partition
+    (anomaly_percentile) so they can be compared across partitions.
+    The feature columns are written once to a float32 matrix with the rows
+    grouped by partition; each worker memory-maps it and trains on its
+    contiguous slice, so no partition frame is pickled.
+    """
+    groups = features_df[partition_by] if isinstance(partition_by, str) else partition_by
+    groups = groups.astype(str)
+    sizes = groups.map(groups.value_counts())
+    partitions = groups.where(sizes >= min_partition_size, POOLED_PARTITION).to_numpy()
+
+    # Partitions in order of first appearance, each one a contiguous row range
+    names = pd.unique(partitions)
+    order = np.argsort(pd.Index(names).get_indexer(partitions), kind='stable')
+    grouped = features_df.iloc[order]
+    bounds = np.cumsum([0] + [int((partitions == name).sum()) for name in names])
+    labels = grouped['label'].to_numpy() if 'label' in grouped.columns else None
+
+    print(f"Training {len(names)} partitioned models by {getattr(partition_by, 'name', partition_by)}")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_matrix(grouped, feature_columns(features_df), os.path.join(workdir, 'features.npy'))
+        tasks = [(name, path, start, stop, None if labels is None else labels[start:stop])
+                 for name, start, stop in zip(names, bounds[:-1], bounds[1:])]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            scored = list(pool.map(_train_and_score_partition, tasks))
+
+    # Back from partition order to the caller's row order
+    scores = pd.concat(scored).iloc[np.argsort(order)]
+    scores.index = features_df.index
+    return pd.concat([features_df, scores], axis=1)
+
+def _train_and_score_partition(task):
+    """Process pool worker: fit and score one partition of the shared feature matrix"""
+    name, path, start, stop, labels = task
+    matrix, metadata = open_matrix(path)
+    part = matrix_frame(matrix, metadata['columns'], start, stop)
+    if labels is not None:
+        part['label'] = labels
+
+    # The pool already uses every core, so each model stays single-threaded
+    artifact = train(part, n_jobs=1)
+    part = score(part, artifact)
+    scores = part.drop(columns=metadata['columns'] + ['label'], errors='ignore')
+    scores['partition'] = name
+
+    # Higher means more anomalous in both modes
+    if artifact['kind'] == 'supervised':
+        strength = scores['anomaly_prob']
+    else:
+        strength = -scores['anomaly_decision']
+    scores['anomaly_percentile'] = strength.rank(pct=True)
+    return scores
+
+def feature_columns(features_df):
+    """Model input columns of a features frame, in frame order"""
+    return [col for col in features_df.columns if col not in NON_FEATURE_COLUMNS]
+
+def train(features_df, artifact_path=None, n_jobs=-1, peer_baseline=None, sample_size=None):
+    """
+    Fit the scaler and models on a features frame and return the artifact.
+    Labelled frames train the supervised models, others the Isolation Forest.
+    With `peer_baseline` (see src.peer_baseline), the peer deviation features
+    are added before fitting and the baseline is stored in the artifact, so
+    score() derives the same features for new batches without recomputing it.
+    The unsupervised model is fit on at most `sample_size` rows when given.
+    The artifact is also saved to `artifact_path` when given.
+    """
+    if peer_baseline is not None:
+        from src.peer_baseline import add_peer_features
+        features_df = add_peer_features(features_df, peer_baseline)
+
+    if 'label' in features_df.columns:
+        artifact = train_supervised(features_df, n_jobs)
+    else:
+        artifact = train_unsupervised(features_df, n_jobs, sample_size)
+    artifact['peer_baseline'] = peer_baseline
+
+    if artifact_path is not None:
+        save_model(artifact, artifact_path)
+    return artifact
+
+def train_unsupervised(features_df, n_jobs=-1, sample_size=None):
+    """
+    Fit the scaler and Isolation Forest, on a reservoir sample of at most
+    `sample_size` rows when given. Each tree only looks at 256 rows, so a
+    bounded sample is enough and the full matrix is never materialized.
+    """
+    feature_cols = feature_columns(features_df)
+    if sample_size is not None and len(features_df) > sample_size:
+        features_df = reservoir_sample([features_df[feature_cols]], sample_size)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(features_df[feature_cols])
+
+    model = IsolationForest(contamination=0.1, random_state=42, n_jobs=n_jobs)
+    model.fit(X_scaled)
+    return _artifact('unsupervised', feature_cols, scaler, model)
+
+def train_supervised(features_df, n_jobs=-1):
+    """Fit the scaler, the anomaly classifier and, if possible, the threat type classifier"""
+    feature_cols = feature_columns(features_df)
+    labels = features_df['label']
+    y = (labels != 'normal').astype(int)
+
     # Standardize features
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
+    X_scaled = scaler.fit_transform(features_df[feature_cols])
+
     # Train classifier
-    clf = RandomForestClassifier(random_state=42)
+    clf = RandomForestClassifier(random_state=42, n_jobs=n_jobs)
     clf.fit(X_scaled, y)
-    
-    # Get predictions
-    features_df['anomaly_prob'] = clf.predict_proba(X_scaled)[:, 1]  # Probability of being anomalous
-    features_df['anomaly_score'] = features_df['anomaly_prob'].apply(lambda p: -1 if p > 0.5 else 1)
-    
+
     # Get feature importances
     importances = pd.DataFrame({
         'feature': feature_cols,
         'importance': clf.feature_importances_
     }).sort_values('importance', ascending=False)
-    
-    # Save feature importances
-    os.makedirs('outputs', exist_ok=True)
-    importances.to_csv('outputs/feature_importances.csv', index=False)
-    print(f"Feature importances saved to outputs/feature_importances.csv")
-    
-    # Restore original labels
-    features_df['label'] = original_labels
-    
-    # Additional analysis for different types of threats
-    if len(set(original_labels)) > 2:  # If we have more than just normal/anomalous
-        # Train multi-class classifier to distinguish between different threat types
-        print("Training multi-class classifier for threat type identification")
-        
-        # Encode labels
+
+    artifact = _artifact('supervised', feature_cols, scaler, clf)
+    artifact['feature_importances'] = importances
+
+    # Train multi-class classifier to distinguish between different threat types
+    if len(set(labels)) > 2:  # If we have more than just normal/anomalous
         le = LabelEncoder()
-        threat_labels = le.fit_transform(original_labels)
-        
+        threat_labels = le.fit_transform(labels)
+
         # Train classifier only on the anomalous data
-        anomalous_idx = features_df['is_anomalous'] == 1
+        anomalous_idx = (y == 1).values
         if sum(anomalous_idx) > 1:  # Need at least 2 samples to train
-            X_anomalous = X_scaled[anomalous_idx]
-            y_anomalous = threat_labels[anomalous_idx]
-            
-            # Train a classifier to distinguish between types of threats
-            threat_clf = RandomForestClassifier(random_state=42)
-            threat_clf.fit(X_anomalous, y_anomalous)
-            
-            # Save the mapping of encoded labels
-            label_mapping = {i: label for i, label in enumerate(le.classes_)}
-            pd.DataFrame({
-                'encoded_value': list(label_mapping.keys()),
-                'threat_type': list(label_mapping.values())
-            }).to_csv('outputs/threat_type_mapping.csv', index=False)
-            
-            # Generate predictions for threat types on anomalous data
-            anomalous_users = features_df.loc[anomalous_idx, 'user'].values
-            
-            try:
-                # Try to get probability predictions for each class
-                threat_probs = threat_clf.predict_proba(X_anomalous)
-                
-                # Create simple DataFrame with user and predicted threat
-                threat_df = pd.DataFrame({
-                    'user': anomalous_users,
-                    'predicted_threat': le.inverse_transform(threat_clf.predict(X_anomalous))
-                })
-                
-                # Add probability columns one by one to avoid shape issues
-                for i, class_name in enumerate(le.classes_):
-                    if i < threat_probs.shape[1]:  # Make sure the column exists
-                        col_name = f"prob_{class_name}"
-                        threat_df[col_name] = threat_probs[:, i]
-            except Exception as e:
-                print(f"Warning: Could not generate detailed threat probabilities: {e}")
-                # Fallback to simpler analysis
-                threat_df = pd.DataFrame({
-                    'user': anomalous_users,
-                    'predicted_threat': le.inverse_transform(threat_clf.predict(X_anomalous))
-                })
-            
-            # Save threat analysis
-            threat_df.to_csv('outputs/threat_analysis.csv', index=False)
-            print(f"Threat type analysis saved to outputs/threat_analysis.csv")
-    
+            threat_clf = RandomForestClassifier(random_state=42, n_jobs=n_jobs)
+            threat_clf.fit(X_scaled[anomalous_idx], threat_labels[anomalous_idx])
+            artifact['threat_model'] = threat_clf
+            artifact['label_encoder'] = le
+
+    return artifact
+
+def _artifact(kind, feature_cols, scaler, model):
+    return {
+        'version': MODEL_ARTIFACT_VERSION,
+        'kind': kind,
+        'trained_at': datetime.now().isoformat(),
+        'feature_cols': list(feature_cols),
+        'scaler': scaler,
+        'model': model,
+        'feature_importances': None,
+        'threat_model': None,
+        'label_encoder': None,
+        'peer_baseline': None
+    }
+
+def save_model(artifact, path=MODEL_PATH):
+    """Serialize a trained artifact with joblib"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    joblib.dump(artifact, path)
+    print(f"Model saved to {path}")
+
+def load_model(path=MODEL_PATH):
+    """Load an artifact written by save_model"""
+    artifact = joblib.load(path)
+    if artifact.get('version') != MODEL_ARTIFACT_VERSION:
+        raise ValueError(
+            f"Model artifact {path} has version {artifact.get('version')}, "
+            f"expected {MODEL_ARTIFACT_VERSION}; retrain the model"
+        )
+    return artifact
+
+def score(features_df, artifact=MODEL_PATH):
+    """
+    Score a features frame with a trained artifact (or a path to one).
+    Only transform/predict calls are made, nothing is refit.
+    """
+    if isinstance(artifact, str):
+        artifact = load_model(artifact)
+
+    features_df = _with_peer_features(features_df, artifact)
+    X_scaled = _scaled_features(features_df, artifact)
+    model = artifact['model']
+
+    if artifact['kind'] == 'supervised':
+        features_df['anomaly_prob'] = _positive_proba(model, X_scaled)  # Probability of being anomalous
+        features_df['anomaly_score'] = np.where(features_df['anomaly_prob'] > 0.5, -1, 1)
+    else:
+        features_df['anomaly_decision'] = model.decision_function(X_scaled)  # < 0 = anomaly
+        features_df['anomaly_score'] = np.where(features_df['anomaly_decision'] < 0, -1, 1)
+    return features_df
+
+def score_chunked(features_df, artifact=MODEL_PATH, chunk_rows=SCORE_CHUNK_ROWS, max_workers=None,
+                  threshold=0.0, matrix_path=None):
+    """
+    score() for large populations: the feature matrix is scaled once into a
+    float32 memory-mapped file (see src.feature_store) and scored in chunks
+    of `chunk_rows` rows across a process pool. Workers get the artifact
+    once and attach to the matrix, so only row ranges are sent to them.
+    The matrix goes to a temporary file unless `matrix_path` is given.
+    Unsupervised artifacts return the continuous anomaly_decision next to
+    the binary anomaly_score, which is -1 where the decision falls below
+    `threshold`, so the cut-off can be moved without refitting. Supervised
+    artifacts flag anomaly_prob above 0.5.
+    """
+    if isinstance(artifact, str):
+        artifact = load_model(artifact)
+
+    features_df = _with_peer_features(features_df, artifact)
+    bounds = [(start, min(start + chunk_rows, len(features_df))) for start in range(0, len(features_df), chunk_rows)]
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_matrix(features_df, artifact['feature_cols'], matrix_path or os.path.join(workdir, 'scaled.npy'),
+                            artifact['scaler'])
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_scoring_worker,
+                                 initargs=(artifact, path)) as pool:
+            values = np.concatenate(list(pool.map(_score_chunk, bounds))) if bounds else np.array([])
+
+    if artifact['kind'] == 'supervised':
+        features_df['anomaly_prob'] = values
+        features_df['anomaly_score'] = np.where(values > 0.5, -1, 1)
+    else:
+        features_df['anomaly_decision'] = values
+        features_df['anomaly_score'] = np.where(values < threshold, -1, 1)
     return features_df
+
+# Artifact and scaled feature matrix of a scoring worker process, set once by _init_scoring_worker
+_worker_artifact = None
+_worker_matrix = None
+
+def _init_scoring_worker(artifact, matrix_path):
+    global _worker_artifact, _worker_matrix
+    _worker_artifact = artifact
+    _worker_matrix, _ = open_matrix(matrix_path)
+
+def _score_chunk(bounds):
+    """Process pool worker: anomaly probability or decision score for one row range of the scaled matrix"""
+    start, stop = bounds
+    artifact = _worker_artifact
+    # Tree models work in float32, so the memory-mapped rows are used as they are
+    X_scaled = _worker_matrix[start:stop]
+    # The pool already uses every core, so each model stays single-threaded
+    model = artifact['model']
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = 1
+    if artifact['kind'] == 'supervised':
+        return _positive_proba(model, X_scaled)
+    return model.decision_function(X_scaled)
+
+def reservoir_sample(chunks, size, seed=42):
+    """
+    Uniform sample of at most `size` rows from an iterable of DataFrame
+    chunks, holding no more than `size` + one chunk of rows at a time. Every
+    row draws a random key and the rows with the smallest keys are kept.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir, keys = None, np.array([])
+    for chunk in chunks:
+        combined = chunk if reservoir is None else pd.concat([reservoir, chunk])
+        keys = np.concatenate([keys, rng.random(len(chunk))])
+        keep = np.sort(np.argsort(keys, kind='stable')[:size])
+        reservoir, keys = combined.iloc[keep], keys[keep]
+    return reservoir
+
+def predict_threats(features_df, artifact=MODEL_PATH, mask=None):
+    """
+    Threat type predictions and per-type probabilities for the rows in `mask`
+    (by default the rows scored as anomalous). Returns None when the
+    artifact has no threat type classifier.
+    """
+    if isinstance(artifact, str):
+        artifact = load_model(artifact)
+    threat_clf = artifact['threat_model']
+    if threat_clf is None:
+        return None
+
+    if mask is None:
+        mask = features_df['anomaly_score'] == -1
+    rows = features_df[mask]
+    le = artifact['label_encoder']
+
+    if len(rows) == 0:
+        return pd.DataFrame(columns=['user', 'predicted_threat'])
+
+    X_rows = _scaled_features(_with_peer_features(rows, artifact), artifact)
+    threat_df = pd.DataFrame({
+        'user': rows['user'].values,
+        'predicted_threat': le.inverse_transform(threat_clf.predict(X_rows))
+    })
+    try:
+        # Add one probability column per threat type the classifier knows
+        threat_probs = threat_clf.predict_proba(X_rows)
+        for i, class_index in enumerate(threat_clf.classes_):
+            threat_df[f"prob_{le.classes_[class_index]}"] = threat_probs[:, i]
+    except Exception as e:
+        print(f"Warning: Could not generate detailed threat probabilities: {e}")
+    return threat_df
+
+def _with_peer_features(features_df, artifact):
+    """Add the artifact's peer deviation features if it was trained with them and they are missing"""
+    baseline = artifact.get('peer_baseline')
+    if baseline is None or set(artifact['feature_cols']).issubset(features_df.columns):
+        return features_df
+    from src.peer_baseline import add_peer_features
+    return add_peer_features(features_df, baseline)
+
+def _scaled_features(features_df, artifact):
+    return artifact['scaler'].transform(features_df[artifact['feature_cols']])
+
+def _positive_proba(clf, X):
+    """Probability of the anomalous class, also for classifiers trained on a single class"""
+    classes = list(clf.classes_)
+    if 1 not in classes:
+        return np.zeros(len(X))
+    return clf.predict_proba(X)[:, classes.index(1)]
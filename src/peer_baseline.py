@@ -0,0 +1,90 @@
+import os
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from src.model import NON_FEATURE_COLUMNS
+
+# Default location of the persisted peer baselines
+PEER_BASELINE_PATH = 'models/peer_baseline.joblib'
+
+# Bump when the baseline layout changes so stale files are rejected
+PEER_BASELINE_VERSION = 1
+
+# Suffix of the per-user deviation features
+PEER_SUFFIX = '_peer_z'
+
+# Groups with fewer members than this are compared to the whole population
+MIN_PEERS = 5
+
+def peer_columns(features_df):
+    """Numeric feature columns that get a peer deviation feature"""
+    numeric = features_df.select_dtypes('number').columns
+    return [col for col in numeric if col not in NON_FEATURE_COLUMNS and not col.endswith(PEER_SUFFIX)]
+
+def compute_peer_baselines(features_df, group_col='department', columns=None, min_peers=MIN_PEERS):
+    """
+    Per-group mean and standard deviation of every numeric feature, from one
+    grouped aggregation, plus the population baseline used for small or
+    unknown groups.
+    """
+    columns = peer_columns(features_df) if columns is None else list(columns)
+    values = features_df[columns].astype('float64')
+    groups = features_df[group_col].astype(str)
+
+    stats = values.groupby(groups).agg(['mean', 'std', 'count'])
+    sizes = groups.value_counts()
+    peers = sizes.index[sizes >= min_peers]
+
+    return {
+        'version': PEER_BASELINE_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'group_col': group_col,
+        'columns': columns,
+        'mean': stats.xs('mean', axis=1, level=1).loc[peers],
+        'std': stats.xs('std', axis=1, level=1).loc[peers],
+        'size': sizes.loc[peers],
+        'global_mean': values.mean(),
+        'global_std': values.std()
+    }
+
+def add_peer_features(features_df, baseline):
+    """
+    Add a <column>_peer_z feature per baseline column: the user's deviation
+    from their group mean in units of the group standard deviation. Group
+    statistics are broadcast to the rows with one reindex, so no Python code
+    runs per user or per group. Columns with no spread get a deviation of 0.
+    """
+    columns = baseline['columns']
+    groups = features_df[baseline['group_col']].astype(str)
+
+    # Rows of small or unseen groups fall back to the population baseline
+    means = baseline['mean'].reindex(groups.values)
+    stds = baseline['std'].reindex(groups.values)
+    known = groups.isin(baseline['mean'].index).values
+    means = np.where(known[:, None], means.to_numpy(), baseline['global_mean'][columns].to_numpy())
+    stds = np.where(known[:, None], stds.to_numpy(), baseline['global_std'][columns].to_numpy())
+
+    values = features_df[columns].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (values - means) / stds
+    z = np.where(np.isfinite(z), z, 0.0)
+
+    peer = pd.DataFrame(z, index=features_df.index, columns=[col + PEER_SUFFIX for col in columns])
+    return pd.concat([features_df.drop(columns=peer.columns, errors='ignore'), peer], axis=1)
+
+def save_peer_baselines(baseline, path=PEER_BASELINE_PATH):
+    """Serialize peer baselines with joblib"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    joblib.dump(baseline, path)
+    print(f"Peer baselines saved to {path}")
+
+def load_peer_baselines(path=PEER_BASELINE_PATH):
+    """Load baselines written by save_peer_baselines"""
+    baseline = joblib.load(path)
+    if baseline.get('version') != PEER_BASELINE_VERSION:
+        raise ValueError(
+            f"Peer baselines {path} have version {baseline.get('version')}, "
+            f"expected {PEER_BASELINE_VERSION}; recompute them"
+        )
+    return baseline
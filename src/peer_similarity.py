@@ -0,0 +1,122 @@
+"""
+Peer-similarity detection. Every user becomes a normalized profile of the
+resources and event types they use; a nearest-neighbour index over the
+profiles of a training window scores each user by the distance to their k
+closest peers. Users unlike anyone else get large distances.
+"""
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.neighbors import KDTree
+from sklearn.preprocessing import normalize
+from src.resource_matrix import accessed_resources, user_resource_matrix
+
+# Default location of a persisted peer index
+PEER_INDEX_PATH = 'models/peer_index.joblib'
+
+# Number of nearest peers a user is compared with
+NEIGHBORS = 10
+
+# Profiles with more columns than this are reduced with TruncatedSVD before
+# indexing; tree searches stay well below a linear scan at this dimensionality
+MAX_DIMENSIONS = 32
+
+# Training-distance quantile above which a user is flagged
+THRESHOLD_QUANTILE = 0.99
+
+def profile_vectors(df, users, resources, event_types):
+    """
+    Unit-length profile per user: the user's share of accesses per resource
+    next to their share of events per event type, as a sparse matrix
+    """
+    parts = [user_resource_matrix(df, users, resources),
+             user_resource_matrix(df, users, event_types, column='event_type')]
+    # Each block sums to one per user, so both carry the same weight
+    shares = sparse.hstack([normalize(part, norm='l1') for part in parts]).tocsr()
+    return normalize(shares)
+
+def build_peer_index(df, k=NEIGHBORS, max_dimensions=MAX_DIMENSIONS, quantile=THRESHOLD_QUANTILE, seed=42):
+    """
+    Build the nearest-neighbour index over the users of a training window.
+    Wide profiles are projected with TruncatedSVD and re-normalized, then
+    indexed with a KDTree, so a query visits a few leaves instead of
+    scanning every user. The flagging threshold is the `quantile` of the
+    training users' own peer distances.
+    """
+    users = pd.Index(np.asarray(df['user'].unique(), dtype=object))
+    resources = accessed_resources(df)
+    event_types = accessed_resources(df, 'event_type')
+    profiles = profile_vectors(df, users, resources, event_types)
+
+    svd = None
+    if profiles.shape[1] > max_dimensions:
+        svd = TruncatedSVD(n_components=max_dimensions, random_state=seed)
+        vectors = normalize(svd.fit_transform(profiles))
+    else:
+        vectors = profiles.toarray()
+
+    index = {
+        'users': users,
+        'resources': resources,
+        'event_types': event_types,
+        'svd': svd,
+        'tree': KDTree(vectors),
+        'k': min(k, len(users) - 1)
+    }
+    # Training users are their own nearest neighbour, so skip that match
+    distances = _peer_distances(index, vectors, exclude_self=True)
+    index['threshold'] = float(np.quantile(distances, quantile))
+    return index
+
+def score_peer_similarity(df, index, exclude_self=False):
+    """
+    Mean distance from every user in `df` to their k nearest peers in the
+    prebuilt index (peer_distance) and a flag (peer_anomaly_score, -1 above
+    the index threshold). Use exclude_self=True when scoring the window the
+    index was built from.
+    """
+    users = pd.Index(np.asarray(df['user'].unique(), dtype=object))
+    profiles = profile_vectors(df, users, index['resources'], index['event_types'])
+    if index['svd'] is not None:
+        vectors = normalize(index['svd'].transform(profiles))
+    else:
+        vectors = profiles.toarray()
+
+    distances = _peer_distances(index, vectors, exclude_self)
+    return pd.DataFrame({
+        'user': users,
+        'peer_distance': distances,
+        'peer_anomaly_score': np.where(distances > index['threshold'], -1, 1)
+    })
+
+def add_peer_similarity_features(df, features_df, index=None):
+    """
+    Merge peer_distance and peer_anomaly_score into a feature table. Without
+    an index, one is built from `df` and the users are scored against it.
+    """
+    exclude_self = index is None
+    if index is None:
+        index = build_peer_index(df)
+    scores = score_peer_similarity(df, index, exclude_self).set_index('user')
+    for col in scores.columns:
+        features_df[col] = features_df['user'].map(scores[col])
+    return features_df
+
+def save_peer_index(index, path=PEER_INDEX_PATH):
+    """Serialize a peer index with joblib"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    joblib.dump(index, path)
+    print(f"Peer index saved to {path}")
+
+def load_peer_index(path=PEER_INDEX_PATH):
+    return joblib.load(path)
+
+def _peer_distances(index, vectors, exclude_self):
+    k = max(index['k'], 1)
+    distances, _ = index['tree'].query(vectors, k=k + 1 if exclude_self else k)
+    if exclude_self:
+        distances = distances[:, 1:]
+    return distances.mean(axis=1)
@@ -0,0 +1,203 @@
+import math
+import os
+import numpy as np
+import pandas as pd
+
+# Rows serialized per write when streaming results to NDJSON or Parquet
+WRITE_CHUNK_ROWS = 50_000
+
+# Users shown per console page
+TOP_K = 20
+
+SIZE_UNITS = np.array(['B', 'KB', 'MB', 'GB', 'TB'])
+
+# Console colour (a colorama Fore name) per threat type
+THREAT_COLORS = {
+    'mass_downloader': 'RED',
+    'off_hours_access': 'MAGENTA',
+    'privilege_abuse': 'YELLOW',
+    'data_snooping': 'BLUE'
+}
+
+def result_format(path):
+    """Output format implied by the file extension: ndjson, parquet or json"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    if ext == '.json':
+        return 'json'
+    raise ValueError(f"Unsupported results file {path!r}, expected .ndjson, .jsonl, .parquet or .json")
+
+def write_results(frame, path, chunk_rows=WRITE_CHUNK_ROWS):
+    """
+    Write result rows to `path`. NDJSON and Parquet are written chunk by
+    chunk, so no single serialized document of all rows is built; .json
+    keeps the original indented array of records.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    output_format = result_format(path)
+    if output_format == 'ndjson':
+        write_ndjson(frame, path, chunk_rows)
+    elif output_format == 'parquet':
+        write_parquet(frame, path, chunk_rows)
+    else:
+        frame.to_json(path, orient='records', indent=2)
+    return path
+
+def write_ndjson(frame, path, chunk_rows=WRITE_CHUNK_ROWS):
+    """One JSON record per line"""
+    with open(path, 'w') as f:
+        for start in range(0, len(frame), chunk_rows):
+            lines = frame.iloc[start:start + chunk_rows].to_json(orient='records', lines=True)
+            f.write(lines if lines.endswith('\n') else lines + '\n')
+
+def write_parquet(frame, path, chunk_rows=WRITE_CHUNK_ROWS):
+    """Parquet file with one row group per chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # One schema for the whole frame, so chunks with all-missing columns still match
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, len(frame), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def read_results(path):
+    """Read a results file written by write_results"""
+    output_format = result_format(path)
+    if output_format == 'ndjson':
+        return pd.read_json(path, orient='records', lines=True)
+    if output_format == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_json(path, orient='records')
+
+def format_file_sizes(sizes):
+    """Vectorized human-readable sizes, e.g. 0 B, 4.8 KB, 182 KB, for an array of byte counts"""
+    sizes = np.nan_to_num(np.asarray(sizes, dtype='float64'))
+    # Index of the largest unit the size reaches, as repeated division by 1024 would find
+    exponent = sum((sizes >= 1024.0 ** k).astype(int) for k in range(1, len(SIZE_UNITS)))
+    scaled = sizes / 1024.0 ** exponent
+
+    # Use whole numbers if the value is large enough
+    whole = scaled.astype('int64').astype(str)
+    decimal = np.char.mod('%.1f', scaled)
+    text = np.char.add(np.char.add(np.where(scaled >= 100, whole, decimal), ' '), SIZE_UNITS[exponent])
+    return np.where(sizes == 0, '0 B', text)
+
+def rank_anomalies(anomalies):
+    """Anomalies ordered from most to least severe by the score the model produced"""
+    if 'anomaly_prob' in anomalies.columns:
+        return anomalies.sort_values('anomaly_prob', ascending=False, kind='stable')
+    if 'anomaly_percentile' in anomalies.columns:
+        return anomalies.sort_values('anomaly_percentile', ascending=False, kind='stable')
+    if 'anomaly_decision' in anomalies.columns:
+        return anomalies.sort_values('anomaly_decision', kind='stable')
+    return anomalies
+
+def page_bounds(total, top_k=TOP_K, page=1):
+    """(first row, end row, page, page count) of a 1-based page, clamped to the available pages"""
+    pages = max(math.ceil(total / top_k), 1)
+    page = min(max(page, 1), pages)
+    start = (page - 1) * top_k
+    return start, min(start + top_k, total), page, pages
+
+def print_report(anomalies, threat_df=None, importances=None, top_k=TOP_K, page=1):
+    """
+    Print the colour-coded detection, threat type and feature importance
+    summaries. Only one page of `top_k` users, most severe first, is
+    rendered, and every line of a page is built with vectorized string
+    operations.
+    """
+    from colorama import Fore, Back, Style, init
+    init(autoreset=True)
+
+    # Print summary of suspicious behaviors
+    print(f"\n{Back.RED}{Fore.WHITE} ===== DETECTION RESULTS ===== {Style.RESET_ALL}")
+    if len(anomalies) > 0:
+        start, end, page, pages = page_bounds(len(anomalies), top_k, page)
+        shown = rank_anomalies(anomalies).iloc[start:end]
+        suffix = f" (showing {start + 1}-{end}, most severe first)" if pages > 1 else ""
+        print(f"{Fore.YELLOW}Found {Fore.RED}{len(anomalies)}{Fore.YELLOW} suspicious users{suffix}:{Style.RESET_ALL}")
+        print('\n'.join(_anomaly_lines(shown, Fore, Style)))
+        if pages > 1:
+            print(f"{Fore.WHITE}Page {page} of {pages}{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.GREEN}No suspicious users detected.{Style.RESET_ALL}")
+    print(f"{Back.RED}{Fore.WHITE} ============================= {Style.RESET_ALL}")
+
+    if threat_df is not None and len(threat_df) > 0:
+        start, end, page, pages = page_bounds(len(threat_df), top_k, page)
+        print(f"\n{Back.BLUE}{Fore.WHITE} ===== THREAT TYPE ANALYSIS ===== {Style.RESET_ALL}")
+        print('\n'.join(_threat_lines(threat_df.iloc[start:end], Fore, Style)))
+        if pages > 1:
+            print(f"{Fore.WHITE}Page {page} of {pages}{Style.RESET_ALL}")
+        print(f"{Back.BLUE}{Fore.WHITE} ================================ {Style.RESET_ALL}")
+
+    if importances is not None and len(importances) > 0:
+        print(f"\n{Back.GREEN}{Fore.BLACK} ===== TOP FEATURES FOR DETECTION ===== {Style.RESET_ALL}")
+        top = importances.head(5)
+        imp_color = _severity_colors(top['importance'], 0.3, 0.1, Fore)
+        print('\n'.join(f"- {Fore.CYAN}" + top['feature'].astype(str) + f":{Style.RESET_ALL} " +
+                        imp_color + top['importance'].map('{:.4f}'.format) + Style.RESET_ALL))
+        print(f"{Back.GREEN}{Fore.BLACK} ====================================== {Style.RESET_ALL}")
+
+def _severity_colors(values, high, medium, Fore):
+    """Red above `high`, yellow above `medium`, green otherwise, for a Series of values"""
+    colors = np.select([values > high, values > medium], [Fore.RED, Fore.YELLOW], Fore.GREEN)
+    return pd.Series(colors, index=values.index)
+
+def _anomaly_lines(rows, Fore, Style):
+    """One multi-line block per anomalous user"""
+    rows = rows.reset_index(drop=True)
+    zeros = pd.Series(0.0, index=rows.index)
+    max_size = rows.get('max_file_size', zeros).fillna(0)
+    total_size = rows.get('total_file_size', zeros).fillna(0)
+    off_hours = rows.get('offhours_access_pct', zeros).fillna(0)
+    cross_dept = rows.get('cross_dept_access_pct', zeros).fillna(0)
+    sensitive = rows.get('sensitive_resource_pct', zeros).fillna(0)
+
+    lines = (f"- {Fore.LIGHTWHITE_EX}" + rows['user'].astype(str) + f"{Style.RESET_ALL} (Department: "
+             f"{Fore.GREEN}" + rows['department'].astype(str) + f"{Style.RESET_ALL})")
+
+    # Show the threat type if using supervised learning
+    if 'label' in rows.columns:
+        labels = rows['label'].astype(str)
+        threat_color = labels.map(lambda label: getattr(Fore, THREAT_COLORS.get(label, 'RED')))
+        threat = (f"\n  {Fore.WHITE}Threat type: " + threat_color + labels + Style.RESET_ALL)
+        lines += threat.where(rows['label'].notna() & (labels != 'normal'), '')
+
+    lines += (f"\n  {Fore.WHITE}Max file size:{Style.RESET_ALL} " + max_size.round().astype('int64').astype(str) +
+              f" bytes ({Fore.CYAN}" + format_file_sizes(max_size) + f"{Style.RESET_ALL})")
+
+    # Color-code percentages based on severity
+    for label, values, suffix in [('Off-hours access', off_hours, 'of activity'),
+                                  ('Cross-department access', cross_dept, 'of file access'),
+                                  ('Sensitive resource access', sensitive, 'of file access')]:
+        lines += (f"\n  {Fore.WHITE}{label}:{Style.RESET_ALL} " + _severity_colors(values, 50, 20, Fore) +
+                  values.map('{:.1f}%'.format) + f"{Style.RESET_ALL} {suffix}")
+
+    lines += (f"\n  {Fore.WHITE}Total data transferred:{Style.RESET_ALL} " +
+              total_size.round().astype('int64').astype(str) +
+              f" bytes ({Fore.CYAN}" + format_file_sizes(total_size) + f"{Style.RESET_ALL})")
+
+    # Show anomaly probability if available (from supervised learning)
+    if 'anomaly_prob' in rows.columns:
+        confidence = rows['anomaly_prob'] * 100
+        lines += (f"\n  {Fore.WHITE}Confidence score:{Style.RESET_ALL} " + _severity_colors(confidence, 90, 70, Fore) +
+                  confidence.map('{:.1f}%'.format) + Style.RESET_ALL)
+    return lines
+
+def _threat_lines(threat_df, Fore, Style):
+    """One block per user with the predicted threat type and per-type probabilities"""
+    threat_df = threat_df.reset_index(drop=True)
+    lines = (f"{Fore.LIGHTWHITE_EX}User: {Fore.YELLOW}" + threat_df['user'].astype(str) + f"{Style.RESET_ALL}\n"
+             f"  {Fore.WHITE}Predicted threat type: {Fore.RED}" + threat_df['predicted_threat'].astype(str) +
+             f"{Style.RESET_ALL}\n  {Fore.WHITE}Threat probabilities:{Style.RESET_ALL}")
+    for col in [c for c in threat_df.columns if c.startswith('prob_')]:
+        prob = threat_df[col] * 100
+        lines += (f"\n    - {Fore.CYAN}{col.replace('prob_', '')}:{Style.RESET_ALL} " +
+                  _severity_colors(prob, 60, 30, Fore) + prob.map('{:.1f}%'.format) + Style.RESET_ALL)
+    return lines + '\n'
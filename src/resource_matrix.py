@@ -0,0 +1,141 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Default location of a persisted access baseline
+ACCESS_BASELINE_PATH = 'models/access_baseline.joblib'
+
+# A resource is typical for a department when at least this share of the
+# department's users access it
+TYPICAL_SHARE = 0.05
+
+# A resource is rare when fewer than this share of all users access it
+RARE_SHARE = 0.01
+
+LEARNED_ACCESS_COLUMNS = ['learned_cross_dept_access_count', 'learned_cross_dept_access_pct',
+                          'rare_resource_access_count', 'rare_resource_access_pct']
+
+def user_departments(features_df):
+    """Department of every user in a feature table (the last one for users that moved)"""
+    return features_df.drop_duplicates('user', keep='last').set_index('user')['department']
+
+def accessed_resources(df, column='resource'):
+    """Distinct non-missing resources (or values of `column`) in an event frame"""
+    resources = df[column].dropna().unique()
+    return pd.Index(np.asarray(resources, dtype=object)).drop('', errors='ignore')
+
+def user_resource_matrix(df, users, resources, column='resource'):
+    """
+    Sparse len(users) x len(resources) matrix of access counts built in one
+    pass over the events. Events of users or resources outside the given
+    indexes are ignored. Other per-event columns (e.g. event_type) can be
+    counted the same way through `column`.
+    """
+    accessed = df[df[column].notna()]
+    user_codes = _positions(users, accessed['user'])
+    resource_codes = _positions(resources, accessed[column])
+    keep = (user_codes >= 0) & (resource_codes >= 0)
+
+    # Duplicate (user, resource) entries are summed into counts
+    return sparse.csr_matrix(
+        (np.ones(keep.sum()), (user_codes[keep], resource_codes[keep])),
+        shape=(len(users), len(resources))
+    )
+
+def learn_access_baseline(df, features_df, typical_share=TYPICAL_SHARE, rare_share=RARE_SHARE):
+    """
+    Learn each department's typical resources and the population's rare
+    resources from the events instead of the hard-coded lists. A
+    department's aggregate row counts how many of its users touched each
+    resource; resources reaching `typical_share` of the department are
+    typical for it, and resources touched by fewer than `rare_share` of all
+    users are rare.
+    """
+    depts = user_departments(features_df)
+    users = pd.Index(depts.index)
+    resources = accessed_resources(df)
+    touched = (user_resource_matrix(df, users, resources) > 0).astype('float64')
+
+    departments = pd.Index(sorted(depts.astype(str).unique()))
+    dept_codes = departments.get_indexer(depts.astype(str).values)
+    membership = sparse.csr_matrix(
+        (np.ones(len(users)), (dept_codes, np.arange(len(users)))),
+        shape=(len(departments), len(users))
+    )
+
+    # Share of each department's users that touched each resource
+    dept_size = np.asarray(membership.sum(axis=1)).ravel()
+    dept_share = sparse.diags(1 / dept_size) @ (membership @ touched)
+    typical = (dept_share >= typical_share).astype('float64').tocsr()
+
+    users_per_resource = np.asarray(touched.sum(axis=0)).ravel()
+    return {
+        'departments': departments,
+        'resources': resources,
+        'typical': typical,
+        'rare': users_per_resource < rare_share * len(users),
+        'typical_share': typical_share,
+        'rare_share': rare_share
+    }
+
+def add_learned_access_features(df, features_df, baseline=None):
+    """
+    Cross-department and rare-resource access counts and shares per user,
+    judged against a learned baseline (learned from `df` when not given).
+    Accesses to a resource the department's baseline does not list are
+    cross-department; resources first seen after the baseline was learned
+    count as both atypical and rare.
+    """
+    if baseline is None:
+        baseline = learn_access_baseline(df, features_df)
+
+    depts = user_departments(features_df)
+    users = pd.Index(depts.index)
+    known = baseline['resources']
+    unseen = accessed_resources(df).difference(known)
+    resources = known.append(unseen)
+    matrix = user_resource_matrix(df, users, resources)
+
+    typical = sparse.hstack([baseline['typical'], sparse.csr_matrix((len(baseline['departments']), len(unseen)))])
+    rare = np.concatenate([baseline['rare'], np.ones(len(unseen), dtype=bool)]).astype('float64')
+
+    # Accesses of every user to every department's typical set, then the user's own column
+    typical_access = (matrix @ typical.T.tocsc()).tocsr()
+    dept_codes = baseline['departments'].get_indexer(depts.astype(str).values)
+    own_typical = np.asarray(typical_access[np.arange(len(users)), np.clip(dept_codes, 0, None)]).ravel()
+    own_typical[dept_codes < 0] = 0
+
+    total = np.asarray(matrix.sum(axis=1)).ravel()
+    cross = total - own_typical
+    rare_count = matrix @ rare
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        learned = pd.DataFrame({
+            'learned_cross_dept_access_count': cross.astype('int64'),
+            'learned_cross_dept_access_pct': np.where(total > 0, cross / total * 100, 0.0),
+            'rare_resource_access_count': rare_count.astype('int64'),
+            'rare_resource_access_pct': np.where(total > 0, rare_count / total * 100, 0.0)
+        }, index=users)
+
+    for col in LEARNED_ACCESS_COLUMNS:
+        features_df[col] = features_df['user'].map(learned[col])
+    return features_df
+
+def save_access_baseline(baseline, path=ACCESS_BASELINE_PATH):
+    """Serialize a learned access baseline with joblib"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    joblib.dump(baseline, path)
+    print(f"Access baseline saved to {path}")
+
+def load_access_baseline(path=ACCESS_BASELINE_PATH):
+    return joblib.load(path)
+
+def _positions(index, values):
+    """Position of every value in `index` (-1 if absent), via the codes for categoricals"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = index.get_indexer(np.asarray(values.cat.categories, dtype=object))
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, lookup[codes], -1)
+    return index.get_indexer(np.asarray(values, dtype=object))
@@ -0,0 +1,72 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from src.ingest import DEFAULT_CHUNKSIZE, concat_events, iter_logs
+from src.feature_engineer import extract_features
+
+KEYS = ['user', 'department']
+
+def shard_ids(users, num_shards):
+    """Stable shard number for every event, from a hash of its user"""
+    hashes = pd.util.hash_pandas_object(users, index=False).to_numpy()
+    return hashes % num_shards
+
+def extract_features_parallel(df, num_shards=None, max_workers=None, windows=None):
+    """
+    extract_features over user-hash shards of `df` in a process pool. Every
+    feature is a per-user aggregate, so the shard results concatenate to the
+    same frame extract_features(df) returns.
+    """
+    max_workers = max_workers or os.cpu_count()
+    num_shards = num_shards or max_workers
+    now = _latest_timestamp(df) if windows else None
+
+    shards = [shard for _, shard in df.groupby(shard_ids(df['user'], num_shards), sort=False)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        parts = list(pool.map(extract_features, shards, [windows] * len(shards), [now] * len(shards)))
+    return _combine(parts)
+
+def extract_features_sharded(file_path, num_shards=None, max_workers=None, chunksize=DEFAULT_CHUNKSIZE,
+                             shard_dir=None, windows=None):
+    """
+    Out-of-core variant of extract_features_parallel. The log is read in
+    chunks and every chunk is split by user hash into per-shard Feather
+    files under `shard_dir` (a temporary directory by default). Each worker
+    then loads one shard at a time, so no process holds the full dataset.
+    """
+    max_workers = max_workers or os.cpu_count()
+    num_shards = num_shards or max_workers
+
+    with tempfile.TemporaryDirectory(dir=shard_dir) as workdir:
+        shard_paths = {}
+        now = None
+        for i, chunk in enumerate(iter_logs(file_path, chunksize)):
+            if windows:
+                latest = _latest_timestamp(chunk)
+                now = latest if now is None else max(now, latest)
+            for shard, part in chunk.groupby(shard_ids(chunk['user'], num_shards), sort=False):
+                path = os.path.join(workdir, f'shard-{shard:05d}-part-{i:05d}.feather')
+                part.reset_index(drop=True).to_feather(path)
+                shard_paths.setdefault(shard, []).append(path)
+
+        paths = list(shard_paths.values())
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parts = list(pool.map(_extract_shard, paths, [windows] * len(paths), [now] * len(paths)))
+    return _combine(parts)
+
+def _extract_shard(paths, windows, now):
+    """Worker: load the spilled parts of one shard and extract its features"""
+    shard = concat_events(pd.read_feather(path) for path in paths)
+    return extract_features(shard, windows, now)
+
+def _latest_timestamp(df):
+    timestamps = df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+    return timestamps.max()
+
+def _combine(parts):
+    """Concatenate shard feature frames in the row order extract_features uses"""
+    features = pd.concat(parts, ignore_index=True)
+    return features.sort_values(KEYS, ignore_index=True)
@@ -0,0 +1,232 @@
+"""
+Long-running detection over a live event stream.
+
+Reads JSONL events from stdin or tails a JSONL log file, groups them into
+micro-batches by size or time, folds each batch into the incremental
+FeatureState, scores the touched users with a model trained by
+src.model.train, and writes alerts as NDJSON:
+
+    tail -F events.jsonl | python -m src.stream --model models/insider_threat_model.joblib
+    python -m src.stream --input events.jsonl --follow --state cache/stream_state.pkl
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from src.feature_state import FeatureState
+from src.ingest import TIMESTAMP_FORMAT
+from src.model import MODEL_PATH, load_model, score
+
+# Micro-batching defaults
+MAX_BATCH_SIZE = 1000
+MAX_BATCH_WAIT = 1.0   # seconds
+LATENCY_TARGET = 5.0   # seconds from reading an event to emitting its alert
+MAX_QUEUE = 100_000    # events buffered between the reader and the scorer
+
+_EOF = object()
+
+def read_lines(path=None, follow=False, poll_interval=0.5):
+    """Lines from stdin (path None or '-') or a file, which is tailed when `follow` is set"""
+    if path in (None, '-'):
+        yield from sys.stdin
+        return
+
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if line:
+                yield line
+            elif follow:
+                time.sleep(poll_interval)
+            else:
+                return
+
+class StreamMetrics:
+    """Throughput, latency and backpressure counters, reported as NDJSON"""
+
+    def __init__(self, events_queue, latency_target):
+        self.queue = events_queue
+        self.latency_target = latency_target
+        self.events_read = 0
+        self.events_scored = 0
+        self.parse_errors = 0
+        self.batches = 0
+        self.alerts = 0
+        self.max_queue_depth = 0
+        self.reader_blocked_s = 0.0
+        self.last_batch_size = 0
+        self.last_latency_s = 0.0
+        self.max_latency_s = 0.0
+        self.latency_violations = 0
+
+    def record_batch(self, size, latency):
+        self.batches += 1
+        self.events_scored += size
+        self.last_batch_size = size
+        self.last_latency_s = latency
+        self.max_latency_s = max(self.max_latency_s, latency)
+        if latency > self.latency_target:
+            self.latency_violations += 1
+
+    def snapshot(self):
+        depth = self.queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        return {
+            'type': 'metrics',
+            'time': datetime.now().isoformat(),
+            'queue_depth': depth,
+            'queue_capacity': self.queue.maxsize,
+            'max_queue_depth': self.max_queue_depth,
+            'reader_blocked_s': round(self.reader_blocked_s, 3),
+            'events_read': self.events_read,
+            'events_scored': self.events_scored,
+            'parse_errors': self.parse_errors,
+            'batches': self.batches,
+            'alerts': self.alerts,
+            'last_batch_size': self.last_batch_size,
+            'last_latency_s': round(self.last_latency_s, 3),
+            'max_latency_s': round(self.max_latency_s, 3),
+            'latency_target_s': self.latency_target,
+            'latency_violations': self.latency_violations
+        }
+
+def run_stream(lines, model_path=MODEL_PATH, alerts=sys.stdout, metrics_out=sys.stderr,
+               max_batch_size=MAX_BATCH_SIZE, max_batch_wait=MAX_BATCH_WAIT,
+               latency_target=LATENCY_TARGET, max_queue=MAX_QUEUE, state_path=None,
+               metrics_interval=10.0):
+    """
+    Score a stream of JSONL lines until it ends (or on KeyboardInterrupt).
+    A reader thread parses lines into a bounded queue, so a slow scorer
+    pushes back on the input instead of buffering without limit.
+    """
+    artifact = load_model(model_path)
+    if state_path and os.path.exists(state_path):
+        state = FeatureState.load(state_path)
+    else:
+        state = FeatureState()
+
+    events = queue.Queue(maxsize=max_queue)
+    metrics = StreamMetrics(events, latency_target)
+    reader = threading.Thread(target=_read_events, args=(lines, events, metrics), daemon=True)
+    reader.start()
+
+    flagged = set()
+    batch, batch_started = [], None
+    last_metrics = time.monotonic()
+    try:
+        while True:
+            timeout = max_batch_wait if batch_started is None else max(
+                batch_started + max_batch_wait - time.monotonic(), 0)
+            try:
+                item = events.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _EOF:
+                break
+            if item is not None:
+                batch.append(item)
+                if batch_started is None:
+                    batch_started = time.monotonic()
+
+            if batch and (len(batch) >= max_batch_size or
+                          time.monotonic() - batch_started >= max_batch_wait):
+                _score_batch(batch, state, artifact, flagged, alerts, metrics)
+                batch, batch_started = [], None
+
+            if time.monotonic() - last_metrics >= metrics_interval:
+                _emit(metrics_out, metrics.snapshot())
+                last_metrics = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if batch:
+            _score_batch(batch, state, artifact, flagged, alerts, metrics)
+        _emit(metrics_out, metrics.snapshot())
+        if state_path:
+            state.save(state_path)
+    return metrics
+
+def _read_events(lines, events, metrics):
+    """Reader thread: parse JSONL lines and queue (receive time, event) pairs"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            metrics.parse_errors += 1
+            continue
+        metrics.events_read += 1
+
+        item = (time.monotonic(), event)
+        try:
+            events.put_nowait(item)
+        except queue.Full:
+            blocked = time.monotonic()
+            events.put(item)
+            metrics.reader_blocked_s += time.monotonic() - blocked
+        metrics.max_queue_depth = max(metrics.max_queue_depth, events.qsize())
+    events.put(_EOF)
+
+def _score_batch(batch, state, artifact, flagged, alerts, metrics):
+    """Update features for one micro-batch, score the touched users and emit new alerts"""
+    received = [r for r, _ in batch]
+    frame = pd.DataFrame([event for _, event in batch])
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], format=TIMESTAMP_FORMAT)
+    for col in ['file_size', 'resource']:
+        if col not in frame.columns:
+            frame[col] = None
+    frame['file_size'] = pd.to_numeric(frame['file_size'], errors='coerce')
+    frame['resource'] = frame['resource'].mask(frame['resource'] == '')
+
+    touched = score(state.update(frame), artifact)
+
+    latency = time.monotonic() - min(received)
+    for row in touched.to_dict('records'):
+        if row['anomaly_score'] != -1:
+            flagged.discard(row['user'])
+            continue
+        if row['user'] in flagged:
+            continue
+        # Alert once when a user becomes anomalous
+        flagged.add(row['user'])
+        metrics.alerts += 1
+        _emit(alerts, {
+            'type': 'alert',
+            'detected_at': datetime.now().isoformat(),
+            'latency_s': round(latency, 3),
+            **row
+        })
+    metrics.record_batch(len(batch), latency)
+
+def _emit(out, record):
+    out.write(json.dumps(record, default=str) + '\n')
+    out.flush()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Streaming insider threat detection")
+    parser.add_argument('--input', default='-', help="JSONL file to read, or - for stdin")
+    parser.add_argument('--follow', action='store_true', help="Keep tailing --input for new lines")
+    parser.add_argument('--model', default=MODEL_PATH, help="Artifact written by src.model.train")
+    parser.add_argument('--state', help="Feature state file to resume from and checkpoint to")
+    parser.add_argument('--output', help="Alert NDJSON file (default: stdout)")
+    parser.add_argument('--metrics', help="Metrics NDJSON file (default: stderr)")
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--batch-wait', type=float, default=MAX_BATCH_WAIT)
+    parser.add_argument('--latency-target', type=float, default=LATENCY_TARGET)
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE)
+    parser.add_argument('--metrics-interval', type=float, default=10.0)
+    args = parser.parse_args()
+
+    alerts = open(args.output, 'a') if args.output else sys.stdout
+    metrics_out = open(args.metrics, 'a') if args.metrics else sys.stderr
+    run_stream(read_lines(args.input, args.follow), args.model, alerts, metrics_out,
+               args.batch_size, args.batch_wait, args.latency_target, args.max_queue,
+               args.state, args.metrics_interval)